@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import sys
+from time import time
+
+from chess import Game, SearchOptions, SearchState, TranspositionTable, alpha_beta, get_AI_move, get_search_pool, find_in_book, \
+    seed_search, move2str, pawn_hash_table, INITIAL_FEN, STROKES_YOLO
+
+#탐색 성능 비교에 사용하는 표준 포지션 (이름, FEN)
+BENCHMARK_POSITIONS = [
+    ('initial', INITIAL_FEN),
+    ('strokes_yolo', STROKES_YOLO),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'),
+    ('endgame', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1'),
+    ('italian', 'r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w KQkq - 1 5'),
+    ('queens_gambit', 'rnbqkb1r/ppp2ppp/4pn2/3p2B1/2PP4/2N5/PP2PPPP/R2QKBNR b KQkq - 3 4'),
+]
+
+#비교할 탐색 설정 (이름, SearchOptions)
+BENCHMARK_CONFIGS = [
+    ('baseline', SearchOptions(null_move=False, late_move_reductions=False)),
+    ('null_move', SearchOptions(null_move=True, late_move_reductions=False)),
+    ('lmr', SearchOptions(null_move=False, late_move_reductions=True)),
+    ('null_move+lmr', SearchOptions(null_move=True, late_move_reductions=True)),
+]
+
+#고정 깊이로 한 포지션을 탐색하고 [수, 점수, 노드 수, 시간(초)] 를 반환
+#workers 가 2 이상이면 루트 수를 그 수만큼의 프로세스에 나누어 탐색
+def run_search(fen, depth, options, workers=1):
+    game = Game(fen)
+    state = SearchState(TranspositionTable(), options=options)
+    state.use_workers(workers)
+    start_time = time()
+    move, score = alpha_beta(game, game.to_move, depth, state=state)
+    return [move, score, state.nodes, time() - start_time]
+
+#모든 포지션에 대해 설정별 노드 수와 시간을 비교하여 출력
+def run_benchmark(depth, positions=BENCHMARK_POSITIONS, configs=BENCHMARK_CONFIGS):
+    totals = { name: [0, 0.0] for name, _ in configs }
+    for position_name, fen in positions:
+        print('{} (depth {})'.format(position_name, depth))
+        for config_name, options in configs:
+            move, score, nodes, elapsed = run_search(fen, depth, options)
+            totals[config_name][0] += nodes
+            totals[config_name][1] += elapsed
+            print('  {:<14} move {:<5} score {:>7} nodes {:>9} time {:>7.2f}s'.format(
+                config_name, move2str(move) if move else '-', score, nodes, elapsed))
+
+    base_nodes, base_time = totals[configs[0][0]]
+    print('total')
+    for config_name, _ in configs:
+        nodes, elapsed = totals[config_name]
+        print('  {:<14} nodes {:>9} ({:>5.1f}% saved) time {:>7.2f}s ({:>5.1f}% saved)'.format(
+            config_name, nodes, 100*(1 - nodes/base_nodes) if base_nodes else 0.0,
+            elapsed, 100*(1 - elapsed/base_time) if base_time else 0.0))
+    print('pawn hash table: {}'.format(pawn_hash_table.stats()))
+    return totals
+
+#워커 프로세스 수를 1부터 늘려가며 같은 탐색을 반복하고, 단일 프로세스 대비 속도 향상을 출력
+def run_parallel_benchmark(depth, max_workers, positions=BENCHMARK_POSITIONS):
+    options = SearchOptions()
+    timings = {}
+    for workers in range(1, max_workers+1):
+        if workers > 1:
+            #프로세스 생성 비용이 측정에 포함되지 않도록 풀을 미리 만들어 둠 (get_search_pool 이 워커를 모두 띄움)
+            get_search_pool(workers)
+        nodes = 0
+        elapsed = 0.0
+        for position_name, fen in positions:
+            move, score, position_nodes, position_time = run_search(fen, depth, options, workers)
+            nodes += position_nodes
+            elapsed += position_time
+            print('  workers {} {:<14} move {:<5} score {:>7} nodes {:>9} time {:>7.2f}s'.format(
+                workers, position_name, move2str(move) if move else '-', score, position_nodes, position_time))
+        timings[workers] = elapsed
+        print('workers {}: nodes {:>9} time {:>7.2f}s speedup {:.2f}x'.format(workers, nodes, elapsed, timings[1]/elapsed))
+    return timings
+
+#JSON 보고서의 기본 탐색 깊이와 시드
+REPORT_DEPTHS = [2, 3, 4]
+REPORT_SEED = 0
+#비교 모드에서 회귀로 표시할 변화율
+REGRESSION_THRESHOLD = 0.10
+
+#get_AI_move 로 한 포지션을 고정 깊이로 탐색하고 보고서 항목(딕셔너리)을 반환
+#탐색마다 새 트랜스포지션 테이블과 같은 시드를 사용하므로 같은 코드는 항상 같은 수, 점수, 노드 수를 기록함
+def report_entry(name, fen, depth, seed):
+    game = Game(fen)
+    state = SearchState(TranspositionTable())
+    seed_search(seed)
+    book = bool(find_in_book(game))
+    start_time = time()
+    move = get_AI_move(game, depth, state=state)
+    elapsed = max(time() - start_time, 1e-6)
+    return { 'position': name, 'fen': fen, 'depth': depth,
+             'move': move2str(move), 'score': state.score, 'book': book,
+             'nodes': state.nodes, 'time': elapsed, 'nps': state.nodes/elapsed }
+#모든 포지션과 깊이에 대해 get_AI_move 를 실행하고 보고서를 path 에 JSON 으로 저장
+def write_report(path, depths=REPORT_DEPTHS, seed=REPORT_SEED, positions=BENCHMARK_POSITIONS):
+    results = []
+    for depth in depths:
+        for name, fen in positions:
+            entry = report_entry(name, fen, depth, seed)
+            results.append(entry)
+            print('{:<14} depth {} move {:<5} score {:>7} nodes {:>9} time {:>7.2f}s ({:.0f} nodes/s){}'.format(
+                name, depth, entry['move'], entry['score'], entry['nodes'], entry['time'], entry['nps'], ' [book]' if entry['book'] else ''))
+    nodes = sum(entry['nodes'] for entry in results)
+    elapsed = sum(entry['time'] for entry in results)
+    report = { 'seed': seed, 'depths': depths, 'results': results,
+               'total': { 'nodes': nodes, 'time': elapsed, 'nps': nodes/elapsed if elapsed else 0.0 } }
+    with open(path, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    print('total nodes {} time {:.2f}s ({:.0f} nodes/s) -> {}'.format(nodes, elapsed, report['total']['nps'], path))
+    return report
+'''
+두 보고서를 비교하여 (포지션, 깊이) 마다 노드 수와 시간의 변화를 출력
+노드 수가 threshold 보다 많이 늘어난 항목은 REGRESSION, 고른 수나 점수가 바뀐 항목은 CHANGED 로 표시
+시간은 항목별로는 측정 오차가 크므로, 전체 nodes/s 가 threshold 보다 많이 줄었을 때만 REGRESSION 으로 표시
+회귀가 하나라도 있으면 False 를 반환
+'''
+def compare_reports(old_path, new_path, threshold=REGRESSION_THRESHOLD):
+    with open(old_path) as old_file:
+        old_report = json.load(old_file)
+    with open(new_path) as new_file:
+        new_report = json.load(new_file)
+    old_entries = { (entry['position'], entry['depth']): entry for entry in old_report['results'] }
+    
+    regressions = 0
+    for new in new_report['results']:
+        old = old_entries.get((new['position'], new['depth']))
+        if old is None:
+            print('{:<14} depth {} only in {}'.format(new['position'], new['depth'], new_path))
+            continue
+        flags = []
+        if new['nodes'] > old['nodes']*(1 + threshold):
+            flags.append('REGRESSION nodes')
+        if new['move'] != old['move'] or new['score'] != old['score']:
+            flags.append('CHANGED {} ({}) -> {} ({})'.format(old['move'], old['score'], new['move'], new['score']))
+        regressions += any(flag.startswith('REGRESSION') for flag in flags)
+        print('{:<14} depth {} nodes {:>9} -> {:>9} ({:+6.1f}%) time {:>7.2f}s -> {:>7.2f}s ({:+6.1f}%) {}'.format(
+            new['position'], new['depth'], old['nodes'], new['nodes'], percent_change(old['nodes'], new['nodes']),
+            old['time'], new['time'], percent_change(old['time'], new['time']), ', '.join(flags)))
+    
+    old_total, new_total = old_report['total'], new_report['total']
+    nps_regression = new_total['nps'] < old_total['nps']*(1 - threshold)
+    regressions += nps_regression
+    print('total nodes {} -> {} ({:+.1f}%) nps {:.0f} -> {:.0f} ({:+.1f}%) {}'.format(
+        old_total['nodes'], new_total['nodes'], percent_change(old_total['nodes'], new_total['nodes']),
+        old_total['nps'], new_total['nps'], percent_change(old_total['nps'], new_total['nps']),
+        'REGRESSION nps' if nps_regression else ''))
+    print('{} regression(s)'.format(regressions))
+    return regressions == 0
+#old 에서 new 로의 변화율(%)
+def percent_change(old, new):
+    return 100.0*(new - old)/old if old else 0.0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fixed-depth search benchmark (search options, parallel root search, JSON reports)')
+    parser.add_argument('-d', '--depth', type=int, default=4, help='search depth in plies')
+    parser.add_argument('-p', '--parallel', action='store_true', help='report speedup vs. number of worker processes')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, help='maximum number of worker processes for --parallel')
+    parser.add_argument('-r', '--report', metavar='FILE', help='run get_AI_move over the positions at --depths and write a JSON report')
+    parser.add_argument('--depths', type=int, nargs='+', default=REPORT_DEPTHS, help='search depths for --report')
+    parser.add_argument('--seed', type=int, default=REPORT_SEED, help='seed for random tie-breaking in --report')
+    parser.add_argument('-c', '--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two JSON reports and flag regressions')
+    parser.add_argument('-t', '--threshold', type=float, default=REGRESSION_THRESHOLD, help='relative increase flagged as a regression')
+    args = parser.parse_args()
+    if args.compare:
+        sys.exit(0 if compare_reports(args.compare[0], args.compare[1], args.threshold) else 1)
+    elif args.report:
+        write_report(args.report, args.depths, args.seed)
+    elif args.parallel:
+        run_parallel_benchmark(args.depth, args.workers)
+    else:
+        run_benchmark(args.depth)
@@ -1,6 +1,15 @@
 from copy import deepcopy
-from random import choice
+from random import choice, Random
 from time import sleep, time
+import json
+import mmap
+import multiprocessing
+import os
+import pickle
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import count
 
 COLOR_MASK = 1 << 3     #색상을 나타내기 위해 사용 -> 비트 연산을 통해 색상을 설정
 WHITE = 0 << 3
@@ -33,6 +42,12 @@ CASTLE_KINGSIDE_BLACK  = 0b1 << 2
 CASTLE_QUEENSIDE_BLACK = 0b1 << 3
 #모든 캐슬링 권리를 하나로 합친 것
 FULL_CASTLING_RIGHTS = CASTLE_KINGSIDE_WHITE|CASTLE_QUEENSIDE_WHITE|CASTLE_KINGSIDE_BLACK|CASTLE_QUEENSIDE_BLACK
+#루크의 처음 위치(인덱스)에서 말이 떠날 때 잃는 캐슬링 권리
+ROOK_CASTLING_RIGHTS = { 0: CASTLE_QUEENSIDE_WHITE, 7: CASTLE_KINGSIDE_WHITE, 56: CASTLE_QUEENSIDE_BLACK, 63: CASTLE_KINGSIDE_BLACK }
+#킹이 움직일 때 잃는 캐슬링 권리
+KING_CASTLING_RIGHTS = { WHITE: CASTLE_KINGSIDE_WHITE|CASTLE_QUEENSIDE_WHITE, BLACK: CASTLE_KINGSIDE_BLACK|CASTLE_QUEENSIDE_BLACK }
+#캐슬링 시 킹의 (출발, 도착) 인덱스에 따른 루크의 (출발, 도착) 인덱스
+CASTLING_ROOK_MOVES = { (4, 6): (7, 5), (4, 2): (0, 3), (60, 62): (63, 61), (60, 58): (56, 59) }
 
 ALL_SQUARES    = 0xFFFFFFFFFFFFFFFF     #체스 보드의 모든 칸을 비트로 표현한 것
 FILE_A         = 0x0101010101010101     #각각의 파일을 비트보드로 표현한 것
@@ -152,14 +167,117 @@ KING_ENDGAME_BONUS = [ 0,  10,  20,  30,  30,  20,  10,   0,
                       20,  30,  40,  50,  50,  40,  30,  20,
                       10,  20,  30,  40,  40,  30,  20,  10,
                        0,  10,  20,  30,  30,  20,  10,   0]
+#7번째 랭크에 있는 룩의 보너스를 칸별 테이블로 표현 (증분 평가용)
+ROOK_BONUS = [ ROOK_ON_SEVENTH_BONUS if 0b1 << index & RANK_7 else 0 for index in range(64) ]
+#증분 평가에 사용하는 체스말 코드별 물질 점수와 칸별 위치 점수 (백 기준, 흑은 음수이고 세로로 뒤집은 칸의 보너스를 사용)
+#킹의 위치 점수는 엔드게임 여부에 따라, 룩의 파일 보너스는 폰 배치에 따라 달라지므로 평가할 때 따로 계산함
+PIECE_SQUARE_BONUS = { PAWN: PAWN_BONUS, KNIGHT: KNIGHT_BONUS, BISHOP: BISHOP_BONUS, ROOK: ROOK_BONUS }
+MATERIAL_SCORES = [ (1 if code&COLOR_MASK == WHITE else -1)*PIECE_VALUES.get(code&PIECE_MASK, 0) for code in range(16) ]
+PIECE_SQUARE_SCORES = [ [ PIECE_SQUARE_BONUS[code&PIECE_MASK][index] if code&COLOR_MASK == WHITE else -PIECE_SQUARE_BONUS[code&PIECE_MASK][index^56]
+                          for index in range(64) ] if code&PIECE_MASK in PIECE_SQUARE_BONUS else [0]*64 for code in range(16) ]
+#조브리스트 해시에 사용할 64비트 난수 -> 시드를 고정하여 실행할 때마다(그리고 프로세스 간에) 같은 키가 나오도록 함
+ZOBRIST_SEED = 0x5EED
+zobrist_random = Random(ZOBRIST_SEED)
+ZOBRIST_PIECES = [ [ zobrist_random.getrandbits(64) if code&PIECE_MASK != EMPTY else 0 for _ in range(64) ] for code in range(16) ]
+ZOBRIST_CASTLING = [ zobrist_random.getrandbits(64) for _ in range(16) ]
+ZOBRIST_EP_FILE = [ zobrist_random.getrandbits(64) for _ in range(8) ]
+ZOBRIST_BLACK_TO_MOVE = zobrist_random.getrandbits(64)
 #디버그 모드 설정 -> True 로 설정하면 추가적인 디버그 정보를 출력 가능
 verbose = False
+#공격 테이블 사용 여부 -> False 로 설정하면 기존 시프트 연산 방식으로 공격 위치를 계산 (비교용)
+use_attack_tables = True
+#체크 마스크 사용 여부 -> False 로 설정하면 기존처럼 모든 수를 두어 보고 체크인지 확인하여 합법적인 수를 고름 (비교용)
+use_check_masks = True
+#동점인 수 중 하나, 또는 오프닝 북의 수를 고를 때 사용하는 난수 생성기 -> seed_search 로 시드를 고정하면 같은 수를 고름
+search_random = Random()
+#조브리스트 키 검증 모드 -> True 로 설정하면 push/pop 마다 키를 처음부터 다시 계산하여 증분 키와 비교
+verify_zobrist = False
+
+#탐색과 오프닝 북의 무작위 선택에 사용할 시드를 설정 (None 이면 다시 무작위로)
+def seed_search(seed=None):
+    search_random.seed(seed)
 
 # ========== CHESS GAME ==========
 
+class Board(list):
+    '''
+    64칸 체스말 코드 리스트(메일박스)에 말 종류별, 색상별 비트보드와 전체 점유 비트보드를 함께 유지하는 보드
+    board[index] = piece 로 칸을 바꿀 때마다 비트보드가 함께 갱신되므로, GUI와 FEN 코드는 리스트로 그대로 사용하고
+    이동 생성과 체크 판정은 보드 전체를 다시 훑지 않고 비트보드를 바로 사용함
+    물질 점수와 위치 점수(킹, 룩 파일 보너스 제외)도 같은 방식으로 증분 갱신되어 평가 함수가 바로 사용함
+    '''
+    def __init__(self, pieces=EMPTY_BOARD):
+        list.__init__(self, pieces)
+        self.refresh()
+    #리스트 내용으로부터 비트보드를 다시 계산
+    def refresh(self):
+        self.piece_bitboards = [0]*16       #체스말 코드(색상|종류)별 비트보드
+        self.color_bitboards = {WHITE: 0, BLACK: 0}
+        self.occupied = 0
+        self.key = 0                        #체스말 배치에 대한 조브리스트 키
+        self.pawn_key = 0                   #폰 배치에 대한 조브리스트 키 (폰 구조 해시 테이블용)
+        self.material = 0                   #물질 점수 (백 기준)
+        self.psqt = 0                       #칸별 위치 점수 (백 기준)
+        for index in range(64):
+            piece = list.__getitem__(self, index)
+            if piece != EMPTY:
+                bit = 0b1 << index
+                self.piece_bitboards[piece] |= bit
+                self.color_bitboards[piece&COLOR_MASK] |= bit
+                self.occupied |= bit
+                self.key ^= ZOBRIST_PIECES[piece][index]
+                if piece&PIECE_MASK == PAWN:
+                    self.pawn_key ^= ZOBRIST_PIECES[piece][index]
+                self.material += MATERIAL_SCORES[piece]
+                self.psqt += PIECE_SQUARE_SCORES[piece][index]
+    #칸의 체스말을 바꾸고 비트보드를 증분 갱신
+    def __setitem__(self, index, piece):
+        if isinstance(index, slice):
+            list.__setitem__(self, index, piece)
+            self.refresh()
+            return
+        if index < 0:
+            index += 64
+        old_piece = list.__getitem__(self, index)
+        bit = 0b1 << index
+        if old_piece != EMPTY:
+            self.piece_bitboards[old_piece] ^= bit
+            self.color_bitboards[old_piece&COLOR_MASK] ^= bit
+            self.occupied ^= bit
+            self.key ^= ZOBRIST_PIECES[old_piece][index]
+            if old_piece&PIECE_MASK == PAWN:
+                self.pawn_key ^= ZOBRIST_PIECES[old_piece][index]
+            self.material -= MATERIAL_SCORES[old_piece]
+            self.psqt -= PIECE_SQUARE_SCORES[old_piece][index]
+        if piece != EMPTY:
+            self.piece_bitboards[piece] |= bit
+            self.color_bitboards[piece&COLOR_MASK] |= bit
+            self.occupied |= bit
+            self.key ^= ZOBRIST_PIECES[piece][index]
+            if piece&PIECE_MASK == PAWN:
+                self.pawn_key ^= ZOBRIST_PIECES[piece][index]
+            self.material += MATERIAL_SCORES[piece]
+            self.psqt += PIECE_SQUARE_SCORES[piece][index]
+        list.__setitem__(self, index, piece)
+    #비트보드를 다시 계산하지 않고 보드를 복사
+    def copy(self):
+        new_board = Board.__new__(Board)
+        list.extend(new_board, self)
+        new_board.piece_bitboards = self.piece_bitboards[:]
+        new_board.color_bitboards = self.color_bitboards.copy()
+        new_board.occupied = self.occupied
+        new_board.key = self.key
+        new_board.pawn_key = self.pawn_key
+        new_board.material = self.material
+        new_board.psqt = self.psqt
+        return new_board
+    
+    def __deepcopy__(self, memo):
+        return self.copy()
+
 class Game:
     def __init__(self, FEN=''):     #체스 게임 초기 상태 설정
-        self.board = INITIAL_BOARD  #체스 보드를 초기 상태로 설정
+        self.board = Board(INITIAL_BOARD)   #체스 보드를 초기 상태로 설정
         self.to_move = WHITE        #다음 수를 둘 플레이어를 백색으로 설정
         self.ep_square = 0          #앙팡상 가능한 위치를 초기화
         self.castling_rights = FULL_CASTLING_RIGHTS     #캐슬링 권리를 초기화
@@ -174,6 +292,140 @@ class Game:
             self.position_history.append(INITIAL_FEN)
             
         self.move_history = []      #이동 히스토리를 초기화
+        self.undo_stack = []        #push 로 둔 수를 pop 으로 되돌리기 위한 정보
+        self.key = zobrist_key(self)        #현재 포지션의 조브리스트 키
+        self.key_history = [self.key]       #반복 판정을 위한 조브리스트 키 히스토리
+        self.status_cache = (None, None)    #마지막으로 계산한 게임 상태 ((조브리스트 키, 반수 시계), 상태) -> game_status 참고
+    #보드와 히스토리 리스트만 복사하여 새 게임 상태를 반환 (deepcopy 보다 빠름)
+    def copy(self):
+        new_game = Game.__new__(Game)
+        new_game.__dict__.update(self.__dict__)
+        new_game.board = self.board.copy()
+        new_game.position_history = self.position_history[:]
+        new_game.move_history = self.move_history[:]
+        new_game.undo_stack = self.undo_stack[:]
+        new_game.key_history = self.key_history[:]
+        return new_game
+    
+    def __deepcopy__(self, memo):
+        return self.copy()
+    '''
+    게임 상태를 복사하지 않고 그 자리에서 수를 둠
+    잡힌 말, 캐슬링 권리, 앙파상 위치, 반수 시계만 undo_stack 에 기록하고 pop 으로 되돌림
+    탐색 중 사용하기 위한 함수로, 이동/포지션 히스토리는 make_move 에서만 갱신함
+    '''
+    def push(self, move):
+        board = self.board
+        leaving_position = move[0]
+        arriving_position = move[1]
+        leaving_index = bb2index(leaving_position)
+        arriving_index = bb2index(arriving_position)
+        moving_piece = board[leaving_index]
+        captured_piece = board[arriving_index]
+        self.undo_stack.append((move, moving_piece, captured_piece, self.castling_rights, self.ep_square, self.halfmove_clock, self.key))
+        #보드 이외 상태(캐슬링 권리, 앙파상, 차례)의 키를 먼저 제거하고 마지막에 새 상태로 다시 더함
+        key = self.key ^ self.board.key ^ ZOBRIST_CASTLING[self.castling_rights] ^ ZOBRIST_BLACK_TO_MOVE
+        if self.ep_square:
+            key ^= ZOBRIST_EP_FILE[bb2index(self.ep_square)%8]
+        
+        #클락 업데이트, 캡처 시 클락 리셋
+        self.halfmove_clock += 1
+        if self.to_move == BLACK:
+            self.fullmove_number += 1
+        if captured_piece != EMPTY:
+            self.halfmove_clock = 0
+        
+        #폰의 이동 처리 (앙파상, 더블 푸시, 승진)
+        ep_square = 0
+        if moving_piece&PIECE_MASK == PAWN:
+            self.halfmove_clock = 0
+            if arriving_position == self.ep_square:
+                remove_captured_ep(self)
+            if is_double_push(leaving_position, arriving_position):
+                ep_square = new_ep_square(leaving_position)
+            if arriving_position&(RANK_1|RANK_8):
+                board[leaving_index] = self.to_move|QUEEN
+        self.ep_square = ep_square
+        
+        #루크나 킹의 이동 시 캐슬링 권리 업데이트, 캐슬링이면 루크도 이동
+        if leaving_index in ROOK_CASTLING_RIGHTS:
+            self.castling_rights &= ~ROOK_CASTLING_RIGHTS[leaving_index]
+        if arriving_index in ROOK_CASTLING_RIGHTS:
+            self.castling_rights &= ~ROOK_CASTLING_RIGHTS[arriving_index]   #루크가 처음 위치에서 잡힘
+        if moving_piece&PIECE_MASK == KING:
+            self.castling_rights &= ~KING_CASTLING_RIGHTS[moving_piece&COLOR_MASK]
+            if (leaving_index, arriving_index) in CASTLING_ROOK_MOVES:
+                rook_from, rook_to = CASTLING_ROOK_MOVES[(leaving_index, arriving_index)]
+                board[rook_to] = board[rook_from]
+                board[rook_from] = EMPTY
+        
+        #위치 및 다음 수 업데이트
+        board[arriving_index] = board[leaving_index]
+        board[leaving_index] = EMPTY
+        self.to_move = opposing_color(self.to_move)
+        
+        #조브리스트 키 업데이트 (보드 키는 칸을 바꿀 때 이미 갱신됨)
+        key ^= board.key ^ ZOBRIST_CASTLING[self.castling_rights]
+        if ep_square:
+            key ^= ZOBRIST_EP_FILE[bb2index(ep_square)%8]
+        self.key = key
+        self.key_history.append(key)
+        if verify_zobrist:
+            assert self.key == zobrist_key(self), 'incremental Zobrist key mismatch after ' + move2str(move)
+            assert board.pawn_key == pawn_zobrist_key(board), 'incremental pawn Zobrist key mismatch after ' + move2str(move)
+    #말을 움직이지 않고 차례만 넘김 (널 무브 가지치기용) -> pop 으로 되돌림
+    def push_null(self):
+        self.undo_stack.append((None, EMPTY, EMPTY, self.castling_rights, self.ep_square, self.halfmove_clock, self.key))
+        key = self.key ^ ZOBRIST_BLACK_TO_MOVE
+        if self.ep_square:
+            key ^= ZOBRIST_EP_FILE[bb2index(self.ep_square)%8]
+        self.ep_square = 0
+        self.halfmove_clock += 1
+        if self.to_move == BLACK:
+            self.fullmove_number += 1
+        self.to_move = opposing_color(self.to_move)
+        self.key = key
+        self.key_history.append(key)
+    #마지막으로 push 한 수를 되돌리고 그 수를 반환 (널 무브였으면 None)
+    def pop(self):
+        move, moving_piece, captured_piece, castling_rights, ep_square, halfmove_clock, key = self.undo_stack.pop()
+        board = self.board
+        
+        self.to_move = opposing_color(self.to_move)
+        if self.to_move == BLACK:
+            self.fullmove_number -= 1
+        
+        if move is None:
+            self.castling_rights = castling_rights
+            self.ep_square = ep_square
+            self.halfmove_clock = halfmove_clock
+            self.key = key
+            self.key_history.pop()
+            return None
+        
+        leaving_index = bb2index(move[0])
+        arriving_index = bb2index(move[1])
+        board[leaving_index] = moving_piece
+        board[arriving_index] = captured_piece
+        
+        if moving_piece&PIECE_MASK == PAWN and move[1] == ep_square:
+            if ep_square & RANK_3:
+                board[bb2index(north_one(ep_square))] = WHITE|PAWN
+            if ep_square & RANK_6:
+                board[bb2index(south_one(ep_square))] = BLACK|PAWN
+        if moving_piece&PIECE_MASK == KING and (leaving_index, arriving_index) in CASTLING_ROOK_MOVES:
+            rook_from, rook_to = CASTLING_ROOK_MOVES[(leaving_index, arriving_index)]
+            board[rook_from] = board[rook_to]
+            board[rook_to] = EMPTY
+        
+        self.castling_rights = castling_rights
+        self.ep_square = ep_square
+        self.halfmove_clock = halfmove_clock
+        self.key = key
+        self.key_history.pop()
+        if verify_zobrist:
+            assert self.key == zobrist_key(self), 'Zobrist key mismatch after undoing ' + move2str(move)
+        return move
     #게임의 이동 히스토리를 문자열로 반환
     def get_move_list(self):
         return ' '.join(self.move_history)
@@ -230,7 +482,7 @@ class Game:
         board_str = FEN_list[0]
         rank_list = board_str.split('/')    #/로 구분하여 랭크 리스트로 만듬
         rank_list.reverse()         #리스트를 역순으로 변환하여 체스보드의 하단부터 설정
-        self.board = []             #숫자는 빈칸을 의미, 문자는 체스말을 의미
+        pieces = []                 #숫자는 빈칸을 의미, 문자는 체스말을 의미
         
         for rank in rank_list:
             rank_pieces = []
@@ -240,7 +492,8 @@ class Game:
                         rank_pieces.append(EMPTY)
                 else:
                     rank_pieces.append(str2piece(p))
-            self.board.extend(rank_pieces)
+            pieces.extend(rank_pieces)
+        self.board = Board(pieces)
         #다음 수를 둘 플레이어 설정
         to_move_str = FEN_list[1].lower()
         if to_move_str == 'w':
@@ -270,14 +523,34 @@ class Game:
 
 # ================================
 
+#폰 배치만의 조브리스트 키를 처음부터 계산
+def pawn_zobrist_key(board):
+    key = 0
+    for index in range(64):
+        piece = board[index]
+        if piece&PIECE_MASK == PAWN:
+            key ^= ZOBRIST_PIECES[piece][index]
+    return key
+#게임 상태의 조브리스트 키를 처음부터 계산 (체스말 배치, 차례, 캐슬링 권리, 앙파상 위치)
+def zobrist_key(game):
+    key = 0
+    for index in range(64):
+        piece = game.board[index]
+        if piece != EMPTY:
+            key ^= ZOBRIST_PIECES[piece][index]
+    key ^= ZOBRIST_CASTLING[game.castling_rights]
+    if game.ep_square:
+        key ^= ZOBRIST_EP_FILE[bb2index(game.ep_square)%8]
+    if game.to_move == BLACK:
+        key ^= ZOBRIST_BLACK_TO_MOVE
+    return key
 #주어진 비토보드 위치에 있는 체스말을 반환
 def get_piece(board, bitboard):
     return board[bb2index(bitboard)]
 #주어진 비트보드의 1인 비트의 인덱스를 반환        
 def bb2index(bitboard):
-    for i in range(64):
-        if bitboard & (0b1 << i):
-            return i
+    if bitboard:
+        return (bitboard & -bitboard).bit_length() - 1
 #체스 보드 위치 문자열을 인덱스로 변환
 def str2index(position_str):
     fille = FILES.index(position_str[0].lower())
@@ -285,11 +558,9 @@ def str2index(position_str):
     return 8*rank + fille
 #비트보드 위치를 체스 보드 위치 문자열로 변환
 def bb2str(bitboard):
-    for i in range(64):
-        if bitboard & (0b1 << i):
-            fille = i%8
-            rank = int(i/8)
-            return '{}{}'.format(FILES[fille], RANKS[rank])
+    if bitboard:
+        i = bb2index(bitboard)
+        return FILES[i%8] + RANKS[i//8]
 #체스 보드 위치 문자열을 비트보드로 변환
 def str2bb(position_str):
     return 0b1 << str2index(position_str)
@@ -298,17 +569,23 @@ def move2str(move):
     return bb2str(move[0]) + bb2str(move[1])
 #비트보드에서 1인 비트 위치를 생성
 def single_gen(bitboard):
-    for i in range(64):
-        bit = 0b1 << i
-        if bitboard & bit:
-            yield bit
+    while bitboard:
+        bit = bitboard & -bitboard
+        yield bit
+        bitboard ^= bit
 #보드에서 특정 체스말의 위치를 생성
 def piece_gen(board, piece_code):
+    if isinstance(board, Board):
+        yield from single_gen(board.piece_bitboards[WHITE|piece_code] | board.piece_bitboards[BLACK|piece_code])
+        return
     for i in range(64):
         if board[i]&PIECE_MASK == piece_code:
             yield 0b1 << i
 #보드에서 특정 색상의 체스말 위치를 생성
 def colored_piece_gen(board, piece_code, color):
+    if isinstance(board, Board):
+        yield from single_gen(board.piece_bitboards[piece_code|color])
+        return
     for i in range(64):
         if board[i] == piece_code|color:
             yield 0b1 << i
@@ -359,25 +636,32 @@ def print_bitboard(bitboard):
     print('  a b c d e f g h')
 #비트보드의 최하위 1인 비트를 반환함    
 def lsb(bitboard):
-    for i in range(64):
-        bit = (0b1 << i) 
-        if bit & bitboard:
-            return bit
+    if bitboard:
+        return bitboard & -bitboard
 #비트보드의 최상위 1인 비트를 반환
 def msb(bitboard):
-    for i in range(64):
-        bit = (0b1 << (63-i)) 
-        if bit & bitboard:
-            return bit
+    if bitboard:
+        return 0b1 << (bitboard.bit_length() - 1)
 #주어진 색상의 체스말이 있는 위치를 비트보드로 반환
 def get_colored_pieces(board, color):
+    if isinstance(board, Board):
+        return board.color_bitboards[color]
     return list2int([ (i != EMPTY and i&COLOR_MASK == color) for i in board ])
 #빈 칸의 위치를 비트보드로 반환
 def empty_squares(board):
+    if isinstance(board, Board):
+        return nnot(board.occupied)
     return list2int([ i == EMPTY for i in board ])
 #체스말이 있는 칸의 위치를 비트보드로 반환
 def occupied_squares(board):
+    if isinstance(board, Board):
+        return board.occupied
     return nnot(empty_squares(board))
+#주어진 색상과 종류의 체스말 위치를 비트보드로 반환
+def get_piece_bitboard(board, piece_code):
+    if isinstance(board, Board):
+        return board.piece_bitboards[piece_code]
+    return list2int([ i == piece_code for i in board ])
 #주어진 리스트를 비트보드로 변환
 def list2int(lst):
     rev_list = lst[:]
@@ -388,7 +672,7 @@ def nnot(bitboard):
     return ~bitboard & ALL_SQUARES
 #체스 보드를 회전시킴
 def rotate_board(board):
-    rotated_board = deepcopy(board)
+    rotated_board = list(board)
     rotated_board.reverse()
     return rotated_board
 #체스 보드를 수직으로 뒤집음
@@ -430,72 +714,16 @@ def SW_one(bitboard):
 #체스말을 이동시킴
 def move_piece(board, move):
     new_board = deepcopy(board)
-    new_board[bb2index(move[1])] = new_board[bb2index(move[0])] 
-    new_board[bb2index(move[0])] = EMPTY
+    move_piece_in_place(new_board, move)
     return new_board
+#보드를 복사하지 않고 체스말을 이동시킴
+def move_piece_in_place(board, move):
+    board[bb2index(move[1])] = board[bb2index(move[0])] 
+    board[bb2index(move[0])] = EMPTY
 
 def make_move(game, move):
-    #초기설정
-    new_game = deepcopy(game)
-    leaving_position = move[0]
-    arriving_position = move[1]
-    
-    #클락 업데이트
-    new_game.halfmove_clock += 1
-    if new_game.to_move == BLACK:
-        new_game.fullmove_number += 1
-    
-    #캡처 시 클락 리셋
-    if get_piece(new_game.board, arriving_position) != EMPTY:
-        new_game.halfmove_clock = 0
-    
-    #폰의 이동 처리
-    if get_piece(new_game.board, leaving_position)&PIECE_MASK == PAWN:
-        new_game.halfmove_clock = 0
-        
-        if arriving_position == game.ep_square:
-            new_game.board = remove_captured_ep(new_game)
-    
-        if is_double_push(leaving_position, arriving_position):
-            new_game.ep_square = new_ep_square(leaving_position)
-            
-        if arriving_position&(RANK_1|RANK_8):
-            new_game.board[bb2index(leaving_position)] = new_game.to_move|QUEEN
-    
-    #앙파상 위치 리셋
-    if new_game.ep_square == game.ep_square:
-        new_game.ep_square = 0
-        
-    #루크 이동 시 캐슬링 권리 업데이트
-    if leaving_position == str2bb('a1'):
-        new_game.castling_rights = remove_castling_rights(new_game, CASTLE_QUEENSIDE_WHITE)
-    if leaving_position == str2bb('h1'):
-        new_game.castling_rights = remove_castling_rights(new_game, CASTLE_KINGSIDE_WHITE)
-    if leaving_position == str2bb('a8'):
-        new_game.castling_rights = remove_castling_rights(new_game, CASTLE_QUEENSIDE_BLACK)
-    if leaving_position == str2bb('h8'):
-        new_game.castling_rights = remove_castling_rights(new_game, CASTLE_KINGSIDE_BLACK)
-    
-    #캐슬링 처리
-    if get_piece(new_game.board, leaving_position) == WHITE|KING:
-        new_game.castling_rights = remove_castling_rights(new_game, CASTLE_KINGSIDE_WHITE|CASTLE_QUEENSIDE_WHITE)
-        if leaving_position == str2bb('e1'):
-            if arriving_position == str2bb('g1'):
-                new_game.board = move_piece(new_game.board, [str2bb('h1'), str2bb('f1')])
-            if arriving_position == str2bb('c1'):
-                new_game.board = move_piece(new_game.board, [str2bb('a1'), str2bb('d1')])
-        
-    if get_piece(new_game.board, leaving_position) == BLACK|KING:
-        new_game.castling_rights = remove_castling_rights(new_game, CASTLE_KINGSIDE_BLACK|CASTLE_QUEENSIDE_BLACK)
-        if leaving_position == str2bb('e8'):
-            if arriving_position == str2bb('g8'):
-                new_game.board = move_piece(new_game.board, [str2bb('h8'), str2bb('f8')])
-            if arriving_position == str2bb('c8'):
-                new_game.board = move_piece(new_game.board, [str2bb('a8'), str2bb('d8')])
-    
-    #위치 및 다음 수 업데이트
-    new_game.board = move_piece(new_game.board, (leaving_position, arriving_position))
-    new_game.to_move = opposing_color(new_game.to_move)
+    new_game = game.copy()
+    new_game.push(move)
     
     #히스토리 업데이트
     new_game.move_history.append(move2str(move))
@@ -505,11 +733,15 @@ def make_move(game, move):
 #이전 이동을 되돌려 게임 상태를 업데이트
 def unmake_move(game):
     if len(game.position_history) < 2:
-        return deepcopy(game)
+        return game.copy()
     
-    new_game = Game(game.position_history[-2])
-    new_game.move_history = deepcopy(game.move_history)[:-1]
-    new_game.position_history = deepcopy(game.position_history)[:-1]
+    if game.undo_stack:
+        new_game = game.copy()
+        new_game.pop()
+    else:
+        new_game = Game(game.position_history[-2])
+    new_game.move_history = game.move_history[:-1]
+    new_game.position_history = game.position_history[:-1]
     return new_game
 #주어진 랭크 번호에 해당하는 비트보드를 반환
 def get_rank(rank_num):
@@ -530,10 +762,12 @@ def get_filter(filter_str):
 # ========== PAWN ==========
 #보드에 있는 모든 폰의 위치를 비트보드로 반환
 def get_all_pawns(board):
+    if isinstance(board, Board):
+        return board.piece_bitboards[WHITE|PAWN] | board.piece_bitboards[BLACK|PAWN]
     return list2int([ i&PIECE_MASK == PAWN for i in board ])
 #주어진 색상의 폰의 위치를 비트보드로 반환
 def get_pawns(board, color):
-    return list2int([ i == color|PAWN for i in board ])
+    return get_piece_bitboard(board, color|PAWN)
 #폰의 가능한 이동을 계산
 def pawn_moves(moving_piece, game, color):
     return pawn_pushes(moving_piece, game.board, color) | pawn_captures(moving_piece, game, color)
@@ -555,6 +789,8 @@ def pawn_ep_captures(attacking_piece, game, color):
     return pawn_attacks(attacking_piece, game.board, color) & ep_squares
 #폰의 가능한 모든 공격 위치를 계산
 def pawn_attacks(attacking_piece, board, color):
+    if use_attack_tables:
+        return table_attacks(PAWN_ATTACK_TABLE[color], attacking_piece & get_colored_pieces(board, color))
     return pawn_east_attacks(attacking_piece, board, color) | pawn_west_attacks(attacking_piece, board, color)
 #폰의 가능한 단순 푸시를 계산
 def pawn_simple_pushes(moving_piece, board, color):
@@ -595,22 +831,26 @@ def new_ep_square(leaving_square):
         return south_one(leaving_square)
 #앙파상 캡처로 제거된 폰을 보드에서 제거
 def remove_captured_ep(game):
-    new_board = deepcopy(game.board)
     if game.ep_square & RANK_3:
-        new_board[bb2index(north_one(game.ep_square))] = EMPTY
+        game.board[bb2index(north_one(game.ep_square))] = EMPTY
     if game.ep_square & RANK_6:
-        new_board[bb2index(south_one(game.ep_square))] = EMPTY
-    return new_board
+        game.board[bb2index(south_one(game.ep_square))] = EMPTY
+    return game.board
 
 # ========== KNIGHT ==========
 #주어진 색상의 나이트 위치를 비트보드로 반환
 def get_knights(board, color):
-    return list2int([ i == color|KNIGHT for i in board ])
+    return get_piece_bitboard(board, color|KNIGHT)
 #주어진 나이트의 모든 가능한 이동을 반환
 def knight_moves(moving_piece, board, color):
     return knight_attacks(moving_piece) & nnot(get_colored_pieces(board, color))
 #주어진 나이트의 모든 공격 위치를 반환
 def knight_attacks(moving_piece):
+    if use_attack_tables:
+        return table_attacks(KNIGHT_ATTACK_TABLE, moving_piece)
+    return knight_attacks_shift(moving_piece)
+#시프트 연산으로 나이트의 모든 공격 위치를 계산 (공격 테이블 생성 및 비교용)
+def knight_attacks_shift(moving_piece):
     return knight_NNE(moving_piece) | \
            knight_ENE(moving_piece) | \
            knight_NNW(moving_piece) | \
@@ -663,12 +903,17 @@ def knight_distance(pos1, pos2):
 # ========== KING ==========
 #주어진 색상의 킹의 위치를 비트보드로 반환
 def get_king(board, color):
-    return list2int([ i == color|KING for i in board ])
+    return get_piece_bitboard(board, color|KING)
 #주어진 킹의 모든 가능한 이동을 반환
 def king_moves(moving_piece, board, color):
     return king_attacks(moving_piece) & nnot(get_colored_pieces(board, color))
 #주어진 킹의 모든 공격 위치를 반환
 def king_attacks(moving_piece):
+    if use_attack_tables:
+        return table_attacks(KING_ATTACK_TABLE, moving_piece) & nnot(moving_piece)
+    return king_attacks_shift(moving_piece)
+#시프트 연산으로 킹의 모든 공격 위치를 계산 (공격 테이블 생성 및 비교용)
+def king_attacks_shift(moving_piece):
     king_atks = moving_piece | east_one(moving_piece) | west_one(moving_piece)
     king_atks |= north_one(king_atks) | south_one(king_atks)
     return king_atks & nnot(moving_piece)
@@ -725,7 +970,7 @@ def remove_castling_rights(game, removed_rights):
 # ========== BISHOP ==========
 #주어진 색상의 비숍의 위치를 비트보드로 반환
 def get_bishops(board, color):
-    return list2int([ i == color|BISHOP for i in board ])
+    return get_piece_bitboard(board, color|BISHOP)
 #주어진 비숍의 대각선 방향 모든 공격 위치를 반환
 def bishop_rays(moving_piece):
     return diagonal_rays(moving_piece) | anti_diagonal_rays(moving_piece)
@@ -737,24 +982,44 @@ def anti_diagonal_rays(moving_piece):
     return NW_ray(moving_piece) | SE_ray(moving_piece)
 #주어진 방향으로 비숍을 이동 -> 북동쪽 방향 이동
 def NE_ray(moving_piece):
+    if use_attack_tables:
+        return table_attacks(NE_RAY_TABLE, moving_piece)
+    return NE_ray_shift(moving_piece)
+#시프트 연산으로 북동쪽 방향 광선을 계산 (공격 테이블 생성 및 비교용)
+def NE_ray_shift(moving_piece):
     ray_atks = NE_one(moving_piece)
     for _ in range(6):
         ray_atks |= NE_one(ray_atks)
     return ray_atks & ALL_SQUARES
 #남동쪽 방향 이동
 def SE_ray(moving_piece):
+    if use_attack_tables:
+        return table_attacks(SE_RAY_TABLE, moving_piece)
+    return SE_ray_shift(moving_piece)
+#시프트 연산으로 남동쪽 방향 광선을 계산 (공격 테이블 생성 및 비교용)
+def SE_ray_shift(moving_piece):
     ray_atks = SE_one(moving_piece)
     for _ in range(6):
         ray_atks |= SE_one(ray_atks)
     return ray_atks & ALL_SQUARES
 #북서쪽 방향 이동
 def NW_ray(moving_piece):
+    if use_attack_tables:
+        return table_attacks(NW_RAY_TABLE, moving_piece)
+    return NW_ray_shift(moving_piece)
+#시프트 연산으로 북서쪽 방향 광선을 계산 (공격 테이블 생성 및 비교용)
+def NW_ray_shift(moving_piece):
     ray_atks = NW_one(moving_piece)
     for _ in range(6):
         ray_atks |= NW_one(ray_atks)
     return ray_atks & ALL_SQUARES
 #남서쪽 방향 이동
 def SW_ray(moving_piece):
+    if use_attack_tables:
+        return table_attacks(SW_RAY_TABLE, moving_piece)
+    return SW_ray_shift(moving_piece)
+#시프트 연산으로 남서쪽 방향 광선을 계산 (공격 테이블 생성 및 비교용)
+def SW_ray_shift(moving_piece):
     ray_atks = SW_one(moving_piece)
     for _ in range(6):
         ray_atks |= SW_one(ray_atks)
@@ -796,6 +1061,11 @@ def anti_diagonal_attacks(single_piece, board, color):
 #주어진 비숍의 모든 공격 위치를 계산
 def bishop_attacks(moving_piece, board, color):
     atks = 0
+    if use_attack_tables:
+        occupancy = occupied_squares(board)
+        for piece in single_gen(moving_piece):
+            atks |= bishop_attacks_from(bb2index(piece), occupancy)
+        return atks
     for piece in single_gen(moving_piece):
         atks |= diagonal_attacks(piece, board, color) | anti_diagonal_attacks(piece, board, color)
     return atks
@@ -806,7 +1076,7 @@ def bishop_moves(moving_piece, board, color):
 # ========== ROOK ==========
 #주어진 색상의 룩의 위치를 비트보드로 반환
 def get_rooks(board, color):
-    return list2int([ i == color|ROOK for i in board ])
+    return get_piece_bitboard(board, color|ROOK)
 #주어진 룩의 모든 랭크 및 파일 방향 공격 위치를 반환
 def rook_rays(moving_piece):
     return rank_rays(moving_piece) | file_rays(moving_piece)
@@ -818,24 +1088,44 @@ def file_rays(moving_piece):
     return north_ray(moving_piece) | south_ray(moving_piece)
 #주어진 방향으로 룩을 이동시킴 -> 동쪽
 def east_ray(moving_piece):
+    if use_attack_tables:
+        return table_attacks(EAST_RAY_TABLE, moving_piece)
+    return east_ray_shift(moving_piece)
+#시프트 연산으로 동쪽 방향 광선을 계산 (공격 테이블 생성 및 비교용)
+def east_ray_shift(moving_piece):
     ray_atks = east_one(moving_piece)
     for _ in range(6):
         ray_atks |= east_one(ray_atks)
     return ray_atks & ALL_SQUARES
 #서쪽
 def west_ray(moving_piece):
+    if use_attack_tables:
+        return table_attacks(WEST_RAY_TABLE, moving_piece)
+    return west_ray_shift(moving_piece)
+#시프트 연산으로 서쪽 방향 광선을 계산 (공격 테이블 생성 및 비교용)
+def west_ray_shift(moving_piece):
     ray_atks = west_one(moving_piece)
     for _ in range(6):
         ray_atks |= west_one(ray_atks)
     return ray_atks & ALL_SQUARES
 #북쪽
 def north_ray(moving_piece):
+    if use_attack_tables:
+        return table_attacks(NORTH_RAY_TABLE, moving_piece)
+    return north_ray_shift(moving_piece)
+#시프트 연산으로 북쪽 방향 광선을 계산 (공격 테이블 생성 및 비교용)
+def north_ray_shift(moving_piece):
     ray_atks = north_one(moving_piece)
     for _ in range(6):
         ray_atks |= north_one(ray_atks)
     return ray_atks & ALL_SQUARES
 #남쪽
 def south_ray(moving_piece):
+    if use_attack_tables:
+        return table_attacks(SOUTH_RAY_TABLE, moving_piece)
+    return south_ray_shift(moving_piece)
+#시프트 연산으로 남쪽 방향 광선을 계산 (공격 테이블 생성 및 비교용)
+def south_ray_shift(moving_piece):
     ray_atks = south_one(moving_piece)
     for _ in range(6):
         ray_atks |= south_one(ray_atks)
@@ -877,6 +1167,11 @@ def file_attacks(single_piece, board, color):
 #주어진 룩의 모든 공격 위치를 계산
 def rook_attacks(moving_piece, board, color):
     atks = 0
+    if use_attack_tables:
+        occupancy = occupied_squares(board)
+        for single_piece in single_gen(moving_piece):
+            atks |= rook_attacks_from(bb2index(single_piece), occupancy)
+        return atks
     for single_piece in single_gen(moving_piece):
         atks |= rank_attacks(single_piece, board, color) | file_attacks(single_piece, board, color)
     return atks
@@ -887,12 +1182,18 @@ def rook_moves(moving_piece, board, color):
 # ========== QUEEN ==========
 #주어진 색상의 퀸의 위치를 비트보드로 반환
 def get_queen(board, color):
-    return list2int([ i == color|QUEEN for i in board ])
+    return get_piece_bitboard(board, color|QUEEN)
 #주어진 퀸의 모든 랭크, 파일, 대각선 및 반대각선 방향 공격 위치를 반환
 def queen_rays(moving_piece):
     return rook_rays(moving_piece) | bishop_rays(moving_piece)
 #주어진 퀸의 모든 공격 위치를 반환
 def queen_attacks(moving_piece, board, color):
+    if use_attack_tables:
+        occupancy = occupied_squares(board)
+        atks = 0
+        for single_piece in single_gen(moving_piece):
+            atks |= queen_attacks_from(bb2index(single_piece), occupancy)
+        return atks
     return bishop_attacks(moving_piece, board, color) | rook_attacks(moving_piece, board, color)
 #주어진 퀸의 모든 가능한 이동을 반환
 def queen_moves(moving_piece, board, color):
@@ -909,6 +1210,134 @@ def joker_attacks(moving_piece, board, color):
 def joker_moves(moving_piece, board, color):
     return queen_moves(moving_piece, board, color) | knight_moves(moving_piece, board, color)
 
+# ========== ATTACK TABLES ==========
+#비트보드의 각 1인 비트에 대해 테이블을 조회하여 공격 위치를 합침
+def table_attacks(table, bitboard):
+    if bitboard & (bitboard - 1) == 0:
+        if bitboard:
+            return table[bitboard.bit_length() - 1]
+        return 0
+    atks = 0
+    while bitboard:
+        bit = bitboard & -bitboard
+        atks |= table[bit.bit_length() - 1]
+        bitboard ^= bit
+    return atks
+#시프트 연산 함수를 64개의 칸에 적용하여 공격 테이블을 생성
+def build_attack_table(shift_function):
+    return [ shift_function(0b1 << i) for i in range(64) ]
+#임포트 시점에 말 종류별, 광선 방향별로 64칸 공격 테이블을 미리 계산
+KNIGHT_ATTACK_TABLE = build_attack_table(knight_attacks_shift)
+KING_ATTACK_TABLE   = build_attack_table(king_attacks_shift)
+PAWN_ATTACK_TABLE   = { WHITE: build_attack_table(lambda bb: NE_one(bb) | NW_one(bb)),
+                        BLACK: build_attack_table(lambda bb: SE_one(bb) | SW_one(bb)) }
+NE_RAY_TABLE    = build_attack_table(NE_ray_shift)
+SE_RAY_TABLE    = build_attack_table(SE_ray_shift)
+NW_RAY_TABLE    = build_attack_table(NW_ray_shift)
+SW_RAY_TABLE    = build_attack_table(SW_ray_shift)
+EAST_RAY_TABLE  = build_attack_table(east_ray_shift)
+WEST_RAY_TABLE  = build_attack_table(west_ray_shift)
+NORTH_RAY_TABLE = build_attack_table(north_ray_shift)
+SOUTH_RAY_TABLE = build_attack_table(south_ray_shift)
+#두 칸 사이(양 끝 제외)의 칸을 비트보드로 저장한 테이블 -> BETWEEN_TABLE[a][b], 같은 랭크, 파일, 대각선에 있지 않은 칸은 키가 없음
+def build_between_table():
+    between_table = [ {} for _ in range(64) ]
+    for ray_table, opposite_table in ((NE_RAY_TABLE, SW_RAY_TABLE), (SW_RAY_TABLE, NE_RAY_TABLE),
+                                      (NW_RAY_TABLE, SE_RAY_TABLE), (SE_RAY_TABLE, NW_RAY_TABLE),
+                                      (EAST_RAY_TABLE, WEST_RAY_TABLE), (WEST_RAY_TABLE, EAST_RAY_TABLE),
+                                      (NORTH_RAY_TABLE, SOUTH_RAY_TABLE), (SOUTH_RAY_TABLE, NORTH_RAY_TABLE)):
+        for a in range(64):
+            for b_bit in single_gen(ray_table[a]):
+                b = bb2index(b_bit)
+                between_table[a][b] = ray_table[a] & opposite_table[b]
+    return between_table
+BETWEEN_TABLE = build_between_table()
+
+# ========== SLIDING ATTACK TABLES ==========
+'''
+비숍, 룩의 공격 위치를 (칸, 점유 상태) 로 바로 조회하는 테이블
+각 칸마다 공격에 영향을 주는 칸(가장자리 제외)만 남긴 마스크를 만들고,
+마스크의 모든 부분집합(점유 상태)에 대해 공격 위치를 미리 계산하여 딕셔너리에 저장
+조회 시에는 occupancy & mask 를 키로 사용하므로 방향별 블로커 탐색이 필요 없음
+생성된 테이블은 캐시 파일에 저장하여 다음 실행부터는 파일에서 불러옴
+'''
+SLIDING_TABLE_VERSION = 1
+SLIDING_TABLE_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sliding_attacks.cache')
+#주어진 방향으로 한 칸씩 이동하며 처음 만나는 블로커까지의 공격 위치를 계산
+def ray_scan(single_piece, occupancy, step):
+    atks = 0
+    bit = step(single_piece)
+    while bit:
+        atks |= bit
+        if bit & occupancy:
+            break
+        bit = step(bit)
+    return atks
+#비숍의 공격 위치를 블로커 탐색으로 계산 (테이블 생성용)
+def bishop_attacks_scan(single_piece, occupancy):
+    return ray_scan(single_piece, occupancy, NE_one) | ray_scan(single_piece, occupancy, NW_one) | \
+           ray_scan(single_piece, occupancy, SE_one) | ray_scan(single_piece, occupancy, SW_one)
+#룩의 공격 위치를 블로커 탐색으로 계산 (테이블 생성용)
+def rook_attacks_scan(single_piece, occupancy):
+    return ray_scan(single_piece, occupancy, north_one) | ray_scan(single_piece, occupancy, south_one) | \
+           ray_scan(single_piece, occupancy, east_one) | ray_scan(single_piece, occupancy, west_one)
+#비숍의 공격에 영향을 주는 칸의 마스크 (가장자리 칸은 항상 공격되므로 제외)
+def bishop_mask(single_piece):
+    edges = FILE_A | FILE_H | RANK_1 | RANK_8
+    return (NE_ray_shift(single_piece) | NW_ray_shift(single_piece) | \
+            SE_ray_shift(single_piece) | SW_ray_shift(single_piece)) & nnot(edges)
+#룩의 공격에 영향을 주는 칸의 마스크 (각 광선의 마지막 칸은 제외)
+def rook_mask(single_piece):
+    return (north_ray_shift(single_piece) & nnot(RANK_8)) | \
+           (south_ray_shift(single_piece) & nnot(RANK_1)) | \
+           (east_ray_shift(single_piece) & nnot(FILE_H)) | \
+           (west_ray_shift(single_piece) & nnot(FILE_A))
+#마스크의 모든 부분집합에 대해 공격 위치를 계산하여 딕셔너리로 반환
+def build_sliding_table(single_piece, mask, scan_function):
+    table = {}
+    occupancy = 0
+    while True:
+        table[occupancy] = scan_function(single_piece, occupancy)
+        occupancy = (occupancy - mask) & mask
+        if occupancy == 0:
+            return table
+#비숍과 룩의 마스크 및 공격 테이블을 생성
+def build_sliding_tables():
+    bishop_masks = [ bishop_mask(0b1 << i) for i in range(64) ]
+    rook_masks = [ rook_mask(0b1 << i) for i in range(64) ]
+    bishop_tables = [ build_sliding_table(0b1 << i, bishop_masks[i], bishop_attacks_scan) for i in range(64) ]
+    rook_tables = [ build_sliding_table(0b1 << i, rook_masks[i], rook_attacks_scan) for i in range(64) ]
+    return bishop_masks, rook_masks, bishop_tables, rook_tables
+#캐시 파일에서 테이블을 불러오고, 없거나 버전이 다르면 새로 생성하여 저장
+def load_sliding_tables(path=SLIDING_TABLE_CACHE):
+    try:
+        with open(path, 'rb') as cache_file:
+            version, tables = pickle.load(cache_file)
+        if version == SLIDING_TABLE_VERSION:
+            return tables
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        pass
+    
+    tables = build_sliding_tables()
+    try:
+        with open(path, 'wb') as cache_file:
+            pickle.dump((SLIDING_TABLE_VERSION, tables), cache_file, pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        pass    #읽기 전용 저장소에서는 캐시 없이 진행
+    return tables
+
+BISHOP_MASKS, ROOK_MASKS, BISHOP_ATTACK_TABLE, ROOK_ATTACK_TABLE = load_sliding_tables()
+#주어진 칸과 점유 상태에서 비숍의 공격 위치를 조회
+def bishop_attacks_from(index, occupancy):
+    return BISHOP_ATTACK_TABLE[index][occupancy & BISHOP_MASKS[index]]
+#주어진 칸과 점유 상태에서 룩의 공격 위치를 조회
+def rook_attacks_from(index, occupancy):
+    return ROOK_ATTACK_TABLE[index][occupancy & ROOK_MASKS[index]]
+#주어진 칸과 점유 상태에서 퀸의 공격 위치를 조회
+def queen_attacks_from(index, occupancy):
+    return BISHOP_ATTACK_TABLE[index][occupancy & BISHOP_MASKS[index]] | \
+           ROOK_ATTACK_TABLE[index][occupancy & ROOK_MASKS[index]]
+
 # ===========================
 #주어진 위치가 공격받고 있는지 확인
 def is_attacked(target, board, attacking_color):
@@ -918,7 +1347,16 @@ def is_check(board, color):
     return is_attacked(get_king(board, color), board, opposing_color(color))
 #주어진 체스말의 모든 공격 위치를 반환
 def get_attacks(moving_piece, board, color):
-    piece = board[bb2index(moving_piece)]
+    index = bb2index(moving_piece)
+    piece = board[index]
+    
+    if use_attack_tables:
+        if piece&PIECE_MASK == KNIGHT:
+            return KNIGHT_ATTACK_TABLE[index]
+        if piece&PIECE_MASK == KING:
+            return KING_ATTACK_TABLE[index]
+        if piece&PIECE_MASK == PAWN and piece&COLOR_MASK == color:
+            return PAWN_ATTACK_TABLE[color][index]
     
     if piece&PIECE_MASK == PAWN:
         return pawn_attacks(moving_piece, board, color)
@@ -954,6 +1392,9 @@ def get_moves(moving_piece, game, color):
         return joker_moves(moving_piece, game.board, color)
 #특정 위치가 공격받는 횟수를 계산
 def count_attacks(target, board, attacking_color):
+    if use_attack_tables and isinstance(board, Board):
+        return count_pieces(attackers_to(target, board, attacking_color))
+    
     attack_count = 0
       
     for index in range(64):
@@ -965,6 +1406,26 @@ def count_attacks(target, board, attacking_color):
                 attack_count += 1
                       
     return attack_count
+#목표 위치를 공격하는 주어진 색상의 체스말 위치를 비트보드로 반환 (목표 칸에서 역방향으로 테이블 조회)
+def attackers_to(target, board, attacking_color):
+    pieces = board.piece_bitboards
+    occupancy = board.occupied
+    knights = pieces[attacking_color|KNIGHT] | pieces[attacking_color|JOKER]
+    diagonal_sliders = pieces[attacking_color|BISHOP] | pieces[attacking_color|QUEEN] | pieces[attacking_color|JOKER]
+    straight_sliders = pieces[attacking_color|ROOK] | pieces[attacking_color|QUEEN] | pieces[attacking_color|JOKER]
+    pawn_table = PAWN_ATTACK_TABLE[opposing_color(attacking_color)]
+    
+    attackers = 0
+    for single_target in single_gen(target):
+        index = bb2index(single_target)
+        attackers |= (KNIGHT_ATTACK_TABLE[index] & knights) | \
+                     (KING_ATTACK_TABLE[index] & pieces[attacking_color|KING]) | \
+                     (pawn_table[index] & pieces[attacking_color|PAWN])
+        if diagonal_sliders:
+            attackers |= bishop_attacks_from(index, occupancy) & diagonal_sliders
+        if straight_sliders:
+            attackers |= rook_attacks_from(index, occupancy) & straight_sliders
+    return attackers
 #주어진 색상의 체스말의 물질 점수를 계산
 def material_sum(board, color):
     material = 0
@@ -978,19 +1439,139 @@ def material_balance(board):
 #백과 흑 체스말의 이동 가능성 차이를 계산
 def mobility_balance(game):
     return count_legal_moves(game, WHITE) - count_legal_moves(game, BLACK)
+# ========== PAWN STRUCTURE ==========
+#파일별 양 옆 파일의 비트보드 (파일별 비트보드는 FILE_MASKS 를 사용)
+ADJACENT_FILE_MASKS = [ (FILE_MASKS[f-1] if f > 0 else 0) | (FILE_MASKS[f+1] if f < 7 else 0) for f in range(8) ]
+#칸별로 그 칸보다 앞쪽(주어진 색상 기준)에 있는 랭크들의 비트보드
+FORWARD_RANKS = { WHITE: [ ALL_SQUARES << 8*(index//8 + 1) & ALL_SQUARES for index in range(64) ],
+                  BLACK: [ ALL_SQUARES >> 8*(8 - index//8) for index in range(64) ] }
+#통과 폰 판정 마스크 -> 같은 파일과 양 옆 파일에서 앞쪽에 있는 칸 (여기에 상대 폰이 없으면 통과 폰)
+PASSED_PAWN_MASKS = { color: [ (FILE_MASKS[index%8] | ADJACENT_FILE_MASKS[index%8]) & FORWARD_RANKS[color][index] for index in range(64) ]
+                      for color in (WHITE, BLACK) }
+#후방 폰 판정 마스크 -> 양 옆 파일에서 같은 랭크이거나 뒤쪽에 있는 칸 (여기에 자신의 폰이 없으면 지원받을 수 없음)
+PAWN_SUPPORT_MASKS = { color: [ ADJACENT_FILE_MASKS[index%8] & ~FORWARD_RANKS[color][index] for index in range(64) ]
+                       for color in (WHITE, BLACK) }
+#폰 해시 테이블의 기본 엔트리 수
+PAWN_HASH_TABLE_ENTRIES = 1 << 14
+
+#주어진 색상의 폰 구조 점수를 계산 (이중 폰, 고립된 폰, 후방 폰 패널티와 통과 폰 보너스)
+def pawn_structure_score(board, color):
+    pawns = board.piece_bitboards[color|PAWN]
+    enemy_pawns = board.piece_bitboards[opposing_color(color)|PAWN]
+    enemy_attack_table = PAWN_ATTACK_TABLE[color]
+    step = 8 if color == WHITE else -8
+    score = 0
+    for f in range(8):
+        count = count_pieces(pawns & FILE_MASKS[f])
+        if count > 1:
+            score -= DOUBLED_PAWN_PENALTY*(count - 1)
+    for pawn in single_gen(pawns):
+        index = bb2index(pawn)
+        if not pawns & ADJACENT_FILE_MASKS[index%8]:
+            score -= ISOLATED_PAWN_PENALTY
+        elif not pawns & PAWN_SUPPORT_MASKS[color][index] and 0 <= index+step < 64 and \
+             enemy_attack_table[index+step] & enemy_pawns:
+            score -= BACKWARDS_PAWN_PENALTY     #전진할 칸이 상대 폰에게 공격받고 옆 파일의 폰이 지원할 수 없음
+        if not enemy_pawns & PASSED_PAWN_MASKS[color][index] and not pawns & FILE_MASKS[index%8] & FORWARD_RANKS[color][index]:
+            score += PASSED_PAWN_BONUS          #앞을 막는 상대 폰이 없고, 이중 폰의 뒤쪽 폰도 아님
+    return score
+#폰 구조 평가를 처음부터 계산 -> [폰 구조 점수(백 기준), 오픈 파일 마스크, 색상별 세미 오픈 파일 마스크] 를 반환
+#파일 마스크는 a 파일이 0번 비트인 8비트 정수, 세미 오픈 파일은 자신의 폰은 없고 상대 폰만 있는 파일
+def evaluate_pawns(board):
+    white_pawns = board.piece_bitboards[WHITE|PAWN]
+    black_pawns = board.piece_bitboards[BLACK|PAWN]
+    open_files = 0
+    semi_open_files = { WHITE: 0, BLACK: 0 }
+    for f in range(8):
+        white_on_file = white_pawns & FILE_MASKS[f]
+        black_on_file = black_pawns & FILE_MASKS[f]
+        if not white_on_file and not black_on_file:
+            open_files |= 0b1 << f
+        elif not white_on_file:
+            semi_open_files[WHITE] |= 0b1 << f
+        elif not black_on_file:
+            semi_open_files[BLACK] |= 0b1 << f
+    score = pawn_structure_score(board, WHITE) - pawn_structure_score(board, BLACK)
+    return [score, open_files, semi_open_files]
+
+class PawnHashTable:
+    '''
+    폰 조브리스트 키로 인덱싱되는 고정 크기 폰 구조 해시 테이블
+    폰 구조는 형제 노드 사이에서 거의 바뀌지 않으므로, 폰 구조 점수와 룩 보너스에 쓰는 파일 마스크를 저장해 두고 재사용함
+    같은 칸을 다른 폰 배치가 차지하면 항상 교체함
+    엔트리: (폰 키, [폰 구조 점수, 오픈 파일 마스크, 세미 오픈 파일 마스크])
+    '''
+    def __init__(self, entry_count=PAWN_HASH_TABLE_ENTRIES):
+        self.entry_count = max(1, entry_count)
+        self.entries = [None] * self.entry_count
+        self.hits = 0
+        self.misses = 0
+    #보드의 폰 구조 평가를 찾아 반환하고, 없으면 계산하여 저장
+    def probe(self, board):
+        key = board.pawn_key
+        index = key % self.entry_count
+        entry = self.entries[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        result = evaluate_pawns(board)
+        self.entries[index] = (key, result)
+        return result
+    #적중, 실패 카운터를 딕셔너리로 반환
+    def stats(self):
+        probes = self.hits + self.misses
+        return { 'entries': self.entry_count,
+                 'hits': self.hits,
+                 'misses': self.misses,
+                 'hit_rate': self.hits / probes if probes else 0.0 }
+#정적 평가에서 사용하는 기본 폰 해시 테이블
+pawn_hash_table = PawnHashTable()
+
 #게임 상태를 평가
 def evaluate_game(game):
     if game_ended(game):
         return evaluate_end_node(game)
     else:
-        return material_balance(game.board) + positional_balance(game)# + 10*mobility_balance(game)
+        return static_evaluation(game)
+#게임 종료 여부를 확인하지 않고 물질 점수와 위치 점수만으로 게임 상태를 평가
+#Board 이면 증분 갱신된 물질, 위치 점수에 킹 위치 보너스와 폰 구조, 룩 파일 보너스만 더함 (폰 구조는 폰 해시 테이블에서 조회)
+def static_evaluation(game):
+    board = game.board
+    if isinstance(board, Board):
+        [pawn_score, open_files, semi_open_files] = pawn_hash_table.probe(board)
+        return board.material + board.psqt + pawn_score + king_bonus_balance(board) + \
+               rook_file_balance(board, open_files, semi_open_files)
+    return material_balance(game.board) + positional_balance(game)# + 10*mobility_balance(game)
+#백과 흑 킹의 위치 보너스 차이를 계산 (엔드게임이면 엔드게임 테이블 사용)
+#킹이 없는 쪽(FEN 으로 만든 포지션 등)은 보너스를 더하지 않음
+def king_bonus_balance(board):
+    king_bonus = KING_ENDGAME_BONUS if is_endgame(board) else KING_BONUS
+    balance = 0
+    white_king = board.piece_bitboards[WHITE|KING]
+    black_king = board.piece_bitboards[BLACK|KING]
+    if white_king:
+        balance += king_bonus[bb2index(white_king)]
+    if black_king:
+        balance -= king_bonus[bb2index(black_king)^56]
+    return balance
+#백과 흑 룩의 오픈 파일, 세미 오픈 파일 보너스 차이를 계산 (파일 마스크는 폰 해시 테이블의 것을 사용)
+def rook_file_balance(board, open_files, semi_open_files):
+    balance = 0
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        for rook in single_gen(board.piece_bitboards[color|ROOK]):
+            file_bit = 0b1 << (bb2index(rook)%8)
+            if open_files & file_bit:
+                balance += sign*ROOK_OPEN_FILE_BONUS
+            elif semi_open_files[color] & file_bit:
+                balance += sign*ROOK_SEMI_OPEN_FILE_BONUS
+    return balance
 #게임의 종료 상태를 평가
 def evaluate_end_node(game):
-    if is_checkmate(game, game.to_move):
+    status = game_status(game)[0]
+    if status == CHECKMATE:
         return win_score(game.to_move)
-    elif is_stalemate(game) or \
-         has_insufficient_material(game) or \
-         is_under_75_move_rule(game):
+    elif status != ONGOING:
         return 0
 #백과 흑 체스말의 위치적 균형을 계산
 def positional_balance(game):
@@ -1061,28 +1642,105 @@ def win_score(color):
         return 10*PIECE_VALUES[KING]
 #주어진 색상의 모든 가능한 이동을 생성(캐슬링 포함)
 def pseudo_legal_moves(game, color):
-    for index in range(64):
-        piece = game.board[index]
-        
-        if piece != EMPTY and piece&COLOR_MASK == color:
-            piece_pos = 0b1 << index
-            
-            for target in single_gen(get_moves(piece_pos, game, color)):
-                yield (piece_pos, target)
+    for piece_pos in single_gen(get_colored_pieces(game.board, color)):
+        for target in single_gen(get_moves(piece_pos, game, color)):
+            yield (piece_pos, target)
                 
     if can_castle_kingside(game, color):
         yield (get_king(game.board, color), east_one(east_one(get_king(game.board, color))))
     if can_castle_queenside(game, color):
         yield (get_king(game.board, color), west_one(west_one(get_king(game.board, color))))
 #주어진 색상의 모든 합법적인 이동을 생성
+#차례인 쪽이면 체크 마스크와 핀으로 합법적인 수만 바로 생성하고, 아니면 모든 수를 두어 보고 체크인지 확인
 def legal_moves(game, color):
+    if use_check_masks and color == game.to_move and isinstance(game.board, Board) and get_king(game.board, color):
+        yield from check_mask_legal_moves(game, color)
+        return
     for move in pseudo_legal_moves(game, color):
         if is_legal_move(game, move):
             yield move
+#주어진 색상이 공격하는 모든 칸을 비트보드로 반환 (슬라이딩 체스말은 주어진 점유 상태로 계산)
+def attacked_squares(board, attacking_color, occupancy):
+    pieces = board.piece_bitboards
+    attacks = table_attacks(PAWN_ATTACK_TABLE[attacking_color], pieces[attacking_color|PAWN]) | \
+              table_attacks(KNIGHT_ATTACK_TABLE, pieces[attacking_color|KNIGHT] | pieces[attacking_color|JOKER]) | \
+              table_attacks(KING_ATTACK_TABLE, pieces[attacking_color|KING])
+    for slider in single_gen(pieces[attacking_color|BISHOP] | pieces[attacking_color|QUEEN] | pieces[attacking_color|JOKER]):
+        attacks |= bishop_attacks_from(bb2index(slider), occupancy)
+    for slider in single_gen(pieces[attacking_color|ROOK] | pieces[attacking_color|QUEEN] | pieces[attacking_color|JOKER]):
+        attacks |= rook_attacks_from(bb2index(slider), occupancy)
+    return attacks
+#킹과 상대 슬라이딩 체스말 사이에 자신의 체스말이 하나만 있으면 그 체스말은 고정(핀)됨
+#{고정된 체스말 비트보드: 움직일 수 있는 칸(킹과 고정시킨 체스말 사이, 고정시킨 체스말 포함)} 을 반환
+def pinned_pieces(board, color, king_index):
+    pieces = board.piece_bitboards
+    enemy = opposing_color(color)
+    own = board.color_bitboards[color]
+    occupancy = board.occupied
+    pinners = (bishop_attacks_from(king_index, 0) & (pieces[enemy|BISHOP] | pieces[enemy|QUEEN] | pieces[enemy|JOKER])) | \
+              (rook_attacks_from(king_index, 0) & (pieces[enemy|ROOK] | pieces[enemy|QUEEN] | pieces[enemy|JOKER]))
+    pins = {}
+    for pinner in single_gen(pinners):
+        between = BETWEEN_TABLE[king_index][bb2index(pinner)]
+        blockers = between & occupancy
+        if blockers & own and blockers & (blockers - 1) == 0:
+            pins[blockers] = between | pinner
+    return pins
+'''
+체크 마스크와 핀을 이용한 합법적인 수 생성 -> 수를 두어 보지 않고 합법적인 수만 생성함
+포지션마다 한 번씩 상대의 공격 칸(킹을 뺀 점유 상태로 계산), 체크하는 체스말, 고정된 체스말을 계산하고
+킹은 상대가 공격하지 않는 칸으로만, 다른 체스말은 체크를 막거나 체크하는 체스말을 잡는 칸(체크 마스크)과
+고정된 경우 고정된 선 위로만 움직이도록 제한함. 이중 체크에서는 킹만 움직일 수 있음
+앙파상은 두 폰이 한 번에 사라져 랭크 방향의 체크가 드러날 수 있으므로 직접 두어 보고 확인함
+수를 생성하는 순서는 pseudo_legal_moves 와 같음
+'''
+def check_mask_legal_moves(game, color):
+    board = game.board
+    king = get_king(board, color)
+    king_index = bb2index(king)
+    enemy = opposing_color(color)
+    enemy_attacks = attacked_squares(board, enemy, board.occupied ^ king)
+    checkers = attackers_to(king, board, enemy)
+    
+    if not checkers:
+        check_mask = ALL_SQUARES
+    elif checkers & (checkers - 1):
+        check_mask = 0      #이중 체크
+    else:
+        check_mask = checkers | BETWEEN_TABLE[king_index].get(bb2index(checkers), 0)
+    pins = pinned_pieces(board, color, king_index)
+    pawns = get_pawns(board, color)
+    
+    for piece_pos in single_gen(get_colored_pieces(board, color)):
+        if piece_pos == king:
+            targets = get_moves(piece_pos, game, color) & ~enemy_attacks
+            ep_target = 0
+        elif check_mask:
+            targets = get_moves(piece_pos, game, color)
+            ep_target = targets & game.ep_square if piece_pos & pawns else 0
+            targets &= check_mask
+            if piece_pos in pins:
+                targets &= pins[piece_pos]
+            targets |= ep_target
+        else:
+            continue
+        for target in single_gen(targets):
+            if target == ep_target and not is_legal_move(game, (piece_pos, target)):
+                continue
+            yield (piece_pos, target)
+    
+    if not checkers:
+        if can_castle_kingside(game, color):
+            yield (king, east_one(east_one(king)))
+        if can_castle_queenside(game, color):
+            yield (king, west_one(west_one(king)))
 #주어진 이동이 합법적인지 확인
 def is_legal_move(game, move):
-    new_game = make_move(game, move)
-    return not is_check(new_game.board, game.to_move)
+    color = game.to_move
+    game.push(move)
+    legal = not is_check(game.board, color)
+    game.pop()
+    return legal
 #주어진 색상의 합법적인 이동 수를 계산    
 def count_legal_moves(game, color):
     move_count = 0
@@ -1091,12 +1749,10 @@ def count_legal_moves(game, color):
     return move_count
 #현재 게임 상태가 스테일메이트인지 확인
 def is_stalemate(game):
-    for _ in legal_moves(game, game.to_move):
-        return False
-    return not is_check(game.board, game.to_move)
+    return game_status(game)[0] == STALEMATE
 #주어진 색상이 체크메이트 상태인지 확인  
 def is_checkmate(game, color):
-    for _ in legal_moves(game, game.to_move):
+    if game_status(game)[1]:
         return False
     return is_check(game.board, color)  
 #두 개의 FEN문자열이 같은 위치를 나타내는지 확인
@@ -1109,38 +1765,264 @@ def is_same_position(FEN_a, FEN_b):
            FEN_a_list[3] == FEN_b_list[3]
 #현재 위치가 세 번 반복되었는지 확인
 def has_threefold_repetition(game):
-    current_pos = game.position_history[-1]
-    position_count = 0
-    for position in game.position_history:
-        if is_same_position(current_pos, position):
-            position_count += 1
-    return position_count >= 3
+    #마지막 캡처나 폰 이동 이전의 포지션은 다시 나올 수 없으므로 반수 시계만큼만 확인
+    recent_keys = game.key_history[-(game.halfmove_clock+1):]
+    return recent_keys.count(game.key) >= 3
 #50수 규칙에 따라 게임이 종료될 수 있는지 확인
 def is_under_50_move_rule(game):
     return game.halfmove_clock >= 100
 #75수 규칙에 따라 게임이 종료될 수 있는지 확인
 def is_under_75_move_rule(game):
     return game.halfmove_clock >= 150
-#현재 체스판에 남은 체스말로 승부를 낼 수 없는지 확인
+#현재 체스판에 남은 체스말로 승부를 낼 수 없는지 확인 (킹끼리, 또는 킹 대 킹 + 나이트/비숍 하나)
 def has_insufficient_material(game): # TODO: other insufficient positions
-    if material_sum(game.board, WHITE) + material_sum(game.board, BLACK) == 2*PIECE_VALUES[KING]:
+    board = game.board
+    white_pieces = get_colored_pieces(board, WHITE) & ~get_king(board, WHITE)
+    black_pieces = get_colored_pieces(board, BLACK) & ~get_king(board, BLACK)
+    if white_pieces and black_pieces:
+        return False
+    pieces = white_pieces | black_pieces
+    if not pieces:
         return True
-    if material_sum(game.board, WHITE) == PIECE_VALUES[KING]:
-        if material_sum(game.board, BLACK) == PIECE_VALUES[KING] + PIECE_VALUES[KNIGHT] and \
-        (get_knights(game.board, BLACK) != 0 or get_bishops(game.board, BLACK) != 0):
-            return True
-    if material_sum(game.board, BLACK) == PIECE_VALUES[KING]:
-        if material_sum(game.board, WHITE) == PIECE_VALUES[KING] + PIECE_VALUES[KNIGHT] and \
-        (get_knights(game.board, WHITE) != 0 or get_bishops(game.board, WHITE) != 0):
-            return True
-    return False
+    minor_pieces = get_knights(board, WHITE) | get_knights(board, BLACK) | get_bishops(board, WHITE) | get_bishops(board, BLACK)
+    return count_pieces(pieces) == 1 and pieces & minor_pieces != 0
+#game_status 가 반환하는 게임 상태 코드
+ONGOING = 0
+CHECKMATE = 1
+STALEMATE = 2
+INSUFFICIENT_MATERIAL = 3
+SEVENTY_FIVE_MOVE_RULE = 4
+'''
+게임 상태를 한 번에 계산하여 (상태 코드, 둘 수 있는 수가 있는지, 체크 상태인지) 를 반환
+둘 수 있는 수는 합법적인 수를 하나 찾을 때까지만 생성하고, 결과는 포지션(조브리스트 키와 반수 시계)과 함께
+game.status_cache 에 저장해 두므로 같은 포지션에서 game_ended, evaluate_end_node, get_outcome 을 이어서 불러도 한 번만 계산함
+'''
+def game_status(game):
+    position = (game.key, game.halfmove_clock)
+    if game.status_cache[0] == position:
+        return game.status_cache[1]
+    
+    in_check = is_check(game.board, game.to_move)
+    has_legal_move = False
+    for _ in legal_moves(game, game.to_move):
+        has_legal_move = True
+        break
+    
+    if not has_legal_move:
+        status = CHECKMATE if in_check else STALEMATE
+    elif has_insufficient_material(game):
+        status = INSUFFICIENT_MATERIAL
+    elif is_under_75_move_rule(game):
+        status = SEVENTY_FIVE_MOVE_RULE
+    else:
+        status = ONGOING
+    result = (status, has_legal_move, in_check)
+    game.status_cache = (position, result)
+    return result
 #게임이 종료되었는지 확인
 def game_ended(game):
-    return is_checkmate(game, WHITE) or \
-           is_checkmate(game, BLACK) or \
-           is_stalemate(game) or \
-           has_insufficient_material(game) or \
-           is_under_75_move_rule(game)
+    return game_status(game)[0] != ONGOING
+# ========== TRANSPOSITION TABLE ==========
+#저장된 점수의 종류 -> 정확한 값, 하한(베타 컷오프), 상한(모든 수가 알파 이하)
+TT_EXACT = 0
+TT_LOWER = 1
+TT_UPPER = 2
+#트랜스포지션 테이블의 기본 엔트리 수 (버킷당 2개의 슬롯)
+TRANSPOSITION_TABLE_ENTRIES = 1 << 16
+
+class TranspositionTable:
+    '''
+    조브리스트 키로 인덱싱되는 고정 크기 트랜스포지션 테이블
+    각 버킷은 깊이 우선 슬롯과 항상 교체 슬롯으로 구성됨
+    깊이 우선 슬롯은 더 깊게(또는 같은 깊이로) 탐색했거나 이전 탐색에서 남은 엔트리일 때만 교체하고,
+    밀려난 결과는 항상 교체 슬롯에 저장하므로 메모리 사용량이 엔트리 수로 제한됨
+    엔트리: (키, 깊이, 점수, 점수 종류, 최선의 수, 세대)
+    '''
+    def __init__(self, entry_count=TRANSPOSITION_TABLE_ENTRIES):
+        self.bucket_count = max(1, entry_count // 2)
+        self.depth_slots = [None] * self.bucket_count
+        self.always_slots = [None] * self.bucket_count
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+    #새로운 탐색을 시작할 때 세대를 증가시켜 이전 탐색의 엔트리가 교체되도록 함
+    def new_search(self):
+        self.generation += 1
+    #주어진 키의 엔트리를 찾아 반환 (없으면 None)
+    def probe(self, key):
+        index = key % self.bucket_count
+        entry = self.depth_slots[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        other = self.always_slots[index]
+        if other is not None and other[0] == key:
+            self.hits += 1
+            return other
+        if entry is not None or other is not None:
+            self.collisions += 1    #버킷은 다른 포지션이 차지하고 있음
+        self.misses += 1
+        return None
+    #탐색 결과를 버킷에 저장
+    def store(self, key, depth, score, bound, move):
+        index = key % self.bucket_count
+        entry = (key, depth, score, bound, move, self.generation)
+        current = self.depth_slots[index]
+        self.stores += 1
+        if current is None or current[0] == key or depth >= current[1] or current[5] != self.generation:
+            self.depth_slots[index] = entry
+        else:
+            self.always_slots[index] = entry
+    #테이블과 카운터를 초기화
+    def clear(self):
+        self.depth_slots = [None] * self.bucket_count
+        self.always_slots = [None] * self.bucket_count
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+    #적중, 실패, 충돌 카운터를 딕셔너리로 반환
+    def stats(self):
+        probes = self.hits + self.misses
+        return { 'entries': 2*self.bucket_count,
+                 'hits': self.hits,
+                 'misses': self.misses,
+                 'collisions': self.collisions,
+                 'stores': self.stores,
+                 'hit_rate': self.hits / probes if probes else 0.0 }
+#get_AI_move 호출 사이에 유지되는 기본 트랜스포지션 테이블 (서버 세션 동안 계속 사용됨)
+transposition_table = TranspositionTable()
+
+# ========== SEARCH STATE ==========
+#시간 제한이 있을 때 반복 심화 탐색의 최대 깊이
+MAX_SEARCH_DEPTH = 32
+#네가맥스 탐색에서 사용하는 점수 -> 메이트 점수는 win_score 의 크기와 같음
+MATE_SCORE = 10*PIECE_VALUES[KING]
+INFINITE_SCORE = 2*MATE_SCORE
+#반복 심화 탐색에서 이전 깊이의 점수 주변으로 처음 탐색할 창의 크기 (애스피레이션 윈도우)
+ASPIRATION_WINDOW = 50
+
+class SearchTimeout(Exception):
+    '''탐색 시간 예산을 초과했을 때 진행 중인 탐색을 중단하기 위해 발생시키는 예외'''
+
+class SearchOptions:
+    '''
+    탐색 기능을 켜고 끄거나 조정하기 위한 옵션 -> get_AI_move 에 넘겨서 사용
+    move_ordering: 수 정렬 (해시 무브, MVV-LVA, 킬러, 히스토리)
+    quiescence: 깊이 0에서 정지 탐색
+    null_move: 널 무브 가지치기 -> 상대에게 한 수를 더 주고도 베타 이상이면 컷오프
+        null_move_reduction 만큼 더 얕게 탐색하고, null_move_min_depth 미만에서는 사용하지 않음
+    late_move_reductions: 늦게 정렬된 조용한 수를 lmr_reduction 만큼 얕게 먼저 탐색
+        처음 lmr_full_moves 개의 수와 lmr_min_depth 미만의 깊이에서는 줄이지 않음
+    '''
+    def __init__(self, move_ordering=True, quiescence=True,
+                 null_move=True, null_move_reduction=2, null_move_min_depth=3,
+                 late_move_reductions=True, lmr_reduction=1, lmr_min_depth=3, lmr_full_moves=3):
+        self.move_ordering = move_ordering
+        self.quiescence = quiescence
+        self.null_move = null_move
+        self.null_move_reduction = null_move_reduction
+        self.null_move_min_depth = null_move_min_depth
+        self.late_move_reductions = late_move_reductions
+        self.lmr_reduction = lmr_reduction
+        self.lmr_min_depth = lmr_min_depth
+        self.lmr_full_moves = lmr_full_moves
+    
+    def __repr__(self):
+        return 'SearchOptions({})'.format(', '.join('{}={}'.format(k, v) for k, v in self.__dict__.items()))
+
+class SearchState:
+    '''
+    한 번의 탐색 동안 모든 노드가 공유하는 정보
+    트랜스포지션 테이블, 탐색 옵션, 시간 제한(마감 시각), 탐색한 노드 수, 수 정렬 정보와 주 변화를 함께 전달함
+    '''
+    def __init__(self, tt=None, time_budget=None, options=None):
+        self.tt = tt
+        self.options = options if options is not None else SearchOptions()
+        self.deadline = None
+        self.stop_time = None               #외부에서 정한 중단 시각 -> 반복 심화 탐색이 마감 시각을 다시 정해도 유지됨
+        self.nodes = 0
+        self.killers = [ [] for _ in range(MAX_SEARCH_DEPTH+1) ]   #플라이별 킬러 무브
+        self.history = {}                   #컷오프를 일으킨 조용한 수의 히스토리 점수
+        self.pv = [ [] for _ in range(MAX_SEARCH_DEPTH+2) ]        #플라이별 주 변화(삼각 PV 테이블)
+        self.principal_variation = []       #마지막으로 완료된 탐색의 주 변화 (루트부터의 수 리스트)
+        self.score = 0                      #마지막으로 완료된 탐색의 점수 (백 기준)
+        self.pool = None                    #루트 수를 나누어 탐색할 프로세스 풀 (None 이면 단일 프로세스)
+        self.workers = 1                    #프로세스 풀의 워커 수
+        self.abort_flags = None             #워커 프로세스에서 부모 탐색이 끝났는지 확인하는 공유 플래그 배열과 그 중 이 탐색의 칸
+        self.abort_slot = 0
+        if time_budget is not None:
+            self.set_time_budget(time_budget)
+    #밀리초 단위의 시간 예산으로 마감 시각을 설정
+    def set_time_budget(self, time_budget):
+        self.deadline = time() + time_budget/1000.0
+    #workers 개의 프로세스로 루트 수를 나누어 탐색하도록 설정 (1 이하이면 단일 프로세스)
+    def use_workers(self, workers):
+        self.workers = workers
+        self.pool = get_search_pool(workers) if workers > 1 else None
+    #노드 수를 세고, 마감 시각이 지났으면 탐색을 중단
+    def visit(self):
+        self.nodes += 1
+        if self.deadline is not None and time() >= self.deadline:
+            raise SearchTimeout()
+        if self.stop_time is not None and time() >= self.stop_time:
+            raise SearchTimeout()
+        if self.abort_flags is not None and self.nodes & ABORT_CHECK_MASK == 0 and self.abort_flags[self.abort_slot]:
+            raise SearchTimeout()
+    #다른 스레드에서 진행 중인 탐색을 delay(밀리초) 후에 중단시킴 (기본값은 즉시)
+    def stop(self, delay=0):
+        self.stop_time = time() + delay/1000.0
+    #베타 컷오프를 일으킨 조용한 수를 킬러 무브와 히스토리에 기록
+    def record_cutoff(self, game, move, depth, ply):
+        if game.board[bb2index(move[1])] != EMPTY or ply >= len(self.killers):
+            return
+        killers = self.killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[KILLER_MOVES_PER_PLY:]
+        self.history[move] = self.history.get(move, 0) + depth*depth
+
+# ========== MOVE ORDERING ==========
+#수 정렬 점수 -> 해시 무브, 캡처(MVV-LVA), 킬러 무브, 히스토리 순서로 탐색
+HASH_MOVE_ORDER = 1 << 62
+CAPTURE_ORDER   = 1 << 60
+KILLER_ORDER    = 1 << 40
+KILLER_MOVES_PER_PLY = 2
+#정지 탐색의 최대 깊이와 델타 가지치기 여유값
+MAX_QUIESCENCE_DEPTH = 8
+DELTA_PRUNING_MARGIN = 200
+#주어진 수의 정렬 점수를 계산
+def move_order_score(game, move, hash_move, killers, history):
+    if move == hash_move:
+        return HASH_MOVE_ORDER
+    board = game.board
+    attacker = board[bb2index(move[0])]&PIECE_MASK
+    victim = board[bb2index(move[1])]&PIECE_MASK
+    if attacker == PAWN:
+        if move[1] == game.ep_square:
+            victim = PAWN
+        if move[1]&(RANK_1|RANK_8):
+            victim = max(victim, QUEEN)     #승진은 퀸을 잡는 것과 같이 취급
+    if victim != EMPTY:
+        #가장 가치 있는 말을 가장 가치 없는 말로 잡는 수를 먼저 탐색 (MVV-LVA)
+        return CAPTURE_ORDER + PIECE_VALUES[victim]*PIECE_VALUES[KING] - PIECE_VALUES[attacker]
+    if move in killers:
+        return KILLER_ORDER - killers.index(move)
+    return history.get(move, 0)
+#주어진 색상의 의사 합법 수를 정렬한 뒤 합법적인 수만 차례로 생성 (컷오프 이후의 수는 합법성 검사를 하지 않음)
+def ordered_moves(game, color, state, ply, hash_move=None):
+    if not state.options.move_ordering:
+        yield from legal_moves(game, color)
+        return
+    killers = state.killers[ply] if ply < len(state.killers) else []
+    history = state.history
+    moves = list(legal_moves(game, color))
+    moves.sort(key=lambda move: move_order_score(game, move, hash_move, killers, history), reverse=True)
+    yield from moves
+
 #주어진 색상의 체스말의 합법적인 이동 중 하나를 무작위로 선택
 def random_move(game, color):
     return choice(legal_moves(game, color))
@@ -1150,9 +2032,12 @@ def evaluated_move(game, color):
     best_moves = []
     
     for move in legal_moves(game, color):
-        evaluation = evaluate_game(make_move(game, move))
+        game.push(move)
+        evaluation = evaluate_game(game)
+        mate = is_checkmate(game, game.to_move)
+        game.pop()
         
-        if is_checkmate(make_move(game, move), opposing_color(game.to_move)):
+        if mate:
             return [move, evaluation]
         
         if (color == WHITE and evaluation > best_score) or \
@@ -1162,28 +2047,98 @@ def evaluated_move(game, color):
         elif evaluation == best_score:
             best_moves.append(move)
                 
-    return [choice(best_moves), best_score]
+    return [search_random.choice(best_moves), best_score]
+#둘 수 있는 수가 없는 노드의 점수 -> 체크 상태면 체크메이트(color 의 패배), 아니면 스테일메이트(무승부)
+def no_moves_score(game, color):
+    if is_check(game.board, color):
+        return win_score(color)
+    return 0
+#둘 수 있는 수와 관계없이 무승부가 되는 상태인지 확인 (기물 부족, 75수 규칙)
+def is_rule_draw(game):
+    return has_insufficient_material(game) or is_under_75_move_rule(game)
+#주어진 색상의 캡처(앙파상 포함)와 승진 수를 생성 (합법성 검사 전)
+def capture_moves(game, color):
+    enemies = get_colored_pieces(game.board, opposing_color(color))
+    for piece_pos in single_gen(get_colored_pieces(game.board, color)):
+        targets = enemies
+        if game.board[bb2index(piece_pos)]&PIECE_MASK == PAWN:
+            targets |= game.ep_square | RANK_1 | RANK_8
+        for target in single_gen(get_moves(piece_pos, game, color) & targets):
+            yield (piece_pos, target)
+#캡처, 앙파상, 승진이 아닌 조용한 수인지 확인
+def is_quiet_move(game, move):
+    if game.board[bb2index(move[1])] != EMPTY:
+        return False
+    if game.board[bb2index(move[0])]&PIECE_MASK == PAWN:
+        return move[1] != game.ep_square and not move[1]&(RANK_1|RANK_8)
+    return True
+#주어진 색상에 폰과 킹 이외의 말이 남아 있는지 확인
+def has_non_pawn_material(board, color):
+    return get_colored_pieces(board, color) & ~(get_pawns(board, color) | get_king(board, color)) != 0
+#백 기준 점수를 차례인 쪽 기준 점수로 바꾸기 위한 부호
+def side_sign(game):
+    return 1 if game.to_move == WHITE else -1
+'''
+정지 탐색(quiescence search) -> 탐색 깊이의 끝에서 캡처가 이어지는 동안 캡처 수만 계속 탐색하여
+말을 잡히기 직전의 포지션을 정적으로 평가하는 지평선 효과를 줄임
+스탠드 팻: 캡처하지 않고 현재 평가를 그대로 받아들일 수 있으므로 평가가 이미 베타 이상이면 바로 컷오프
+델타 가지치기: 잡는 말의 가치에 여유값을 더해도 알파에 못 미치는 캡처는 탐색하지 않음
+최대 MAX_QUIESCENCE_DEPTH 플라이까지만 탐색하여 캡처 연쇄가 폭발하지 않도록 제한
+네가맥스 형태로, 점수는 차례인 쪽 기준
+'''
+def quiescence(game, alpha, beta, state, qdepth=0):
+    state.visit()
+    sign = side_sign(game)
+    if qdepth == 0 and game_status(game)[0] != ONGOING:
+        return sign*evaluate_end_node(game)
+    
+    stand_pat = sign*static_evaluation(game)
+    if qdepth >= MAX_QUIESCENCE_DEPTH or stand_pat >= beta:
+        return stand_pat
+    alpha = max(alpha, stand_pat)
+    best_score = stand_pat
+    
+    moves = list(capture_moves(game, game.to_move))
+    moves.sort(key=lambda move: move_order_score(game, move, None, [], {}), reverse=True)
+    for move in moves:
+        #델타 가지치기
+        gain = PIECE_VALUES[game.board[bb2index(move[1])]&PIECE_MASK] + DELTA_PRUNING_MARGIN
+        if game.board[bb2index(move[0])]&PIECE_MASK == PAWN:
+            if move[1]&(RANK_1|RANK_8):
+                gain += PIECE_VALUES[QUEEN] - PIECE_VALUES[PAWN]
+            if move[1] == game.ep_square:
+                gain += PIECE_VALUES[PAWN]
+        if stand_pat + gain <= alpha:
+            continue
+        if not is_legal_move(game, move):
+            continue
+        
+        game.push(move)
+        score = -quiescence(game, -beta, -alpha, state, qdepth+1)
+        game.pop()
+        
+        if score > best_score:
+            best_score = score
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+    
+    return best_score
 #미니맥스 알고리즘을 사용하여 주어진 깊이까지 최적의 이동을 결정
+#깊이 0에서만 게임 상태를 평가하고, 체크메이트와 스테일메이트는 합법적인 수가 없는 노드에서 판정
 def minimax(game, color, depth=1):
-    if game_ended(game):
+    if depth <= 0:
         return [None, evaluate_game(game)]
-    
-    [simple_move, simple_evaluation] = evaluated_move(game, color)
-    
-    if depth == 1 or \
-       simple_evaluation == win_score(opposing_color(color)):
-        return [simple_move, simple_evaluation]
+    if is_rule_draw(game):
+        return [None, 0]
     
     best_score = win_score(color)
     best_moves = []
     
     for move in legal_moves(game, color):
-        his_game = make_move(game, move)
-        
-        if is_checkmate(his_game, his_game.to_move):
-            return [move, win_score(his_game.to_move)]
-            
-        [_, evaluation] = minimax(his_game, opposing_color(color), depth-1)
+        game.push(move)
+        [_, evaluation] = minimax(game, opposing_color(color), depth-1)
+        game.pop()
         
         if evaluation == win_score(opposing_color(color)):
             return [move, evaluation]
@@ -1194,82 +2149,307 @@ def minimax(game, color, depth=1):
             best_moves = [move]
         elif evaluation == best_score:
             best_moves.append(move)
-        
-    return [choice(best_moves), best_score]
+    
+    if not best_moves:
+        return [None, no_moves_score(game, color)]
+    return [search_random.choice(best_moves), best_score]
 '''
-알파-베타 가지치기 알고리즘을 사용하여 최적의 이동을 결정
-게임이 종료되었는지 확인, 종료된 경우 게임 상태를 평가하여 반환
-가능한 모든 합법적인 이동을 생성, 각 이동 후 게임 상태를 재귀적으로 평가
-알파-베타 가지치기를 적용하여 불필요한 탐색을 줄임
-최적의 평가 점수를 가진 이동을 찾고, 해당 이동을 반환. 동일한 평가 점수를 가진 이동이 여러 개 있는 경우 무작위로 선택
+주 변화 탐색(PVS)을 사용하는 네가맥스 알파-베타 탐색. 점수는 차례인 쪽 기준 (백/흑 분기 없이 한 경로로 처리)
+첫 번째 수(정렬상 최선의 수)만 전체 창으로 탐색하고, 나머지 수는 널 윈도우(alpha, alpha+1)로
+알파보다 나은지만 확인한 뒤 나은 경우에만 전체 창으로 재탐색함
+깊이 0에서는 정지 탐색으로 평가하고, 합법적인 수가 없으면 체크메이트 또는 스테일메이트 점수를 반환
+최선의 수가 바뀔 때마다 state.pv[ply] 에 이 노드부터의 주 변화를 기록
 '''
-def alpha_beta(game, color, depth, alpha=-float('inf'), beta=float('inf')):
-    if game_ended(game):
-        return [None, evaluate_game(game)]
+def negamax(game, depth, alpha, beta, state, ply):
+    if depth <= 0:
+        if state.options.quiescence:
+            return quiescence(game, alpha, beta, state)
+        state.visit()
+        return side_sign(game)*evaluate_game(game)
+    state.visit()
+    state.pv[ply] = []
+    if is_rule_draw(game):
+        return 0
     
-    [simple_move, simple_evaluation] = evaluated_move(game, color)
+    tt = state.tt
+    hash_move = None
+    #트랜스포지션 테이블 조회 -> 충분히 깊게 탐색한 결과가 있으면 재탐색하지 않고, 아니면 그 수를 먼저 탐색
+    if tt is not None:
+        entry = tt.probe(game.key)
+        if entry is not None:
+            [_, tt_depth, tt_score, tt_bound, hash_move, _] = entry
+            if tt_depth >= depth and hash_move is not None:
+                if tt_bound == TT_EXACT or \
+                   (tt_bound == TT_LOWER and tt_score >= beta) or \
+                   (tt_bound == TT_UPPER and tt_score <= alpha):
+                    state.pv[ply] = [hash_move]
+                    return tt_score
     
-    if depth == 1 or \
-       simple_evaluation == win_score(opposing_color(color)):
-        return [simple_move, simple_evaluation]
-
-    best_moves = []
+    options = state.options
+    in_check = is_check(game.board, game.to_move)
+    
+    #널 무브 가지치기 -> 한 수를 건너뛰고도 얕은 탐색 결과가 베타 이상이면 이 노드는 컷오프
+    #체크 상태, 연속 널 무브, 추크추방(zugzwang)이 흔한 폰만 남은 엔드게임에서는 사용하지 않음
+    if options.null_move and depth >= options.null_move_min_depth and not in_check and \
+       beta < MATE_SCORE and game.undo_stack and game.undo_stack[-1][0] is not None and \
+       has_non_pawn_material(game.board, game.to_move) and not is_endgame(game.board):
+        game.push_null()
+        score = -negamax(game, depth-1-options.null_move_reduction, -beta, -beta+1, state, ply+1)
+        game.pop()
+        if score >= beta:
+            return beta
+    
+    original_alpha = alpha
+    best_score = -INFINITE_SCORE
+    best_move = None
+    move_count = 0
+    killers = state.killers[ply] if ply < len(state.killers) else []
+    
+    for move in ordered_moves(game, game.to_move, state, ply, hash_move):
+        move_count += 1
+        quiet = is_quiet_move(game, move)
+        game.push(move)
+        if move_count == 1:
+            score = -negamax(game, depth-1, -beta, -alpha, state, ply+1)
+        else:
+            #늦은 수 감소 -> 정렬 순서가 늦은 조용한 수는 먼저 얕게 탐색하고, 알파를 넘을 때만 원래 깊이로 탐색
+            reduce = options.late_move_reductions and depth >= options.lmr_min_depth and \
+                     move_count > options.lmr_full_moves and quiet and not in_check and \
+                     move not in killers and not is_check(game.board, game.to_move)
+            if reduce:
+                score = -negamax(game, depth-1-options.lmr_reduction, -alpha-1, -alpha, state, ply+1)
+            if not reduce or score > alpha:
+                score = -negamax(game, depth-1, -alpha-1, -alpha, state, ply+1)
+            if alpha < score < beta:
+                score = -negamax(game, depth-1, -beta, -alpha, state, ply+1)
+        game.pop()
         
-    if color == WHITE:
-        for move in legal_moves(game, color):
-            if verbose:
-                print('\t'*depth + str(depth) + '. evaluating ' + PIECE_CODES[get_piece(game.board, move[0])] + move2str(move))
-                
-            new_game = make_move(game, move)
-            [_, score] = alpha_beta(new_game, opposing_color(color), depth-1, alpha, beta)
-            
-            if verbose:
-                print('\t'*depth + str(depth) + '. ' + str(score) + ' [{},{}]'.format(alpha, beta))
-            
-            if score == win_score(opposing_color(color)):
-                return [move, score]
-            
-            if score == alpha:
-                best_moves.append(move)
-            if score > alpha: # white maximizes her score
+        if score > best_score:
+            best_score = score
+            best_move = move
+            if score > alpha:
                 alpha = score
-                best_moves = [move]
-                if alpha > beta: # alpha-beta cutoff
-                    if verbose:
-                        print('\t'*depth + 'cutoff')
+                state.pv[ply] = [move] + (state.pv[ply+1] if depth > 1 else [])
+                if alpha >= beta or score >= MATE_SCORE: # alpha-beta cutoff (메이트보다 나은 수는 없음)
+                    state.record_cutoff(game, move, depth, ply)
                     break
-        if best_moves:
-            return [choice(best_moves), alpha]
+    
+    if move_count == 0:
+        return -MATE_SCORE if in_check else 0
+    
+    if tt is not None:
+        if best_score >= beta:
+            bound = TT_LOWER
+        elif best_score <= original_alpha:
+            bound = TT_UPPER
         else:
-            return [None, alpha]
+            bound = TT_EXACT
+        tt.store(game.key, depth, best_score, bound, best_move)
+    return best_score
+'''
+루트 노드 탐색 -> [최선의 수, 점수(차례인 쪽 기준), 주 변화] 를 반환
+첫 번째 수 이후의 수는 현재 최선의 점수 바로 아래의 널 윈도우로 먼저 확인하고, 같거나 나은 경우에만 정확한 점수로 재탐색함
+따라서 최선의 점수와 같은 점수는 실제 동점이며, 동점인 수 중 하나를 무작위로 선택
+'''
+def search_root(game, depth, alpha, beta, state):
+    state.visit()
+    hash_move = None
+    if state.tt is not None:
+        entry = state.tt.probe(game.key)
+        if entry is not None:
+            hash_move = entry[4]
     
-    if color == BLACK:
-        for move in legal_moves(game, color):
-            if verbose:
-                print('\t'*depth + str(depth) + '. evaluating ' + PIECE_CODES[get_piece(game.board, move[0])] + move2str(move))
-                
-            new_game = make_move(game, move)
-            [_, score] = alpha_beta(new_game, opposing_color(color), depth-1, alpha, beta)
-            
-            if verbose:
-                print('\t'*depth + str(depth) + '. ' + str(score) + ' [{},{}]'.format(alpha, beta))
-            
-            if score == win_score(opposing_color(color)):
-                return [move, score]
-            
-            if score == beta:
-                best_moves.append(move)
-            if score < beta: # black minimizes his score
-                beta = score
-                best_moves = [move]
-                if alpha > beta: # alpha-beta cutoff
+    best_score = -INFINITE_SCORE
+    best_moves = []
+    pvs = {}
+    for move in ordered_moves(game, game.to_move, state, 0, hash_move):
+        game.push(move)
+        if not best_moves:
+            score = -negamax(game, depth-1, -beta, -alpha, state, 1)
+        else:
+            score = -negamax(game, depth-1, -best_score, -(best_score-1), state, 1)
+            if best_score <= score < beta:
+                score = -negamax(game, depth-1, -beta, -(best_score-1), state, 1)
+        game.pop()
+        
+        if verbose:
+            print('\t' + PIECE_CODES[get_piece(game.board, move[0])] + move2str(move) + ': ' + str(score))
+        
+        if score > best_score or not best_moves:
+            best_score = score
+            best_moves = [move]
+        elif score == best_score:
+            best_moves.append(move)
+        else:
+            continue
+        pvs[move] = [move] + (state.pv[1] if depth > 1 else [])
+        
+        if score >= beta or score >= MATE_SCORE:
+            break
+    
+    if not best_moves:
+        return [None, -MATE_SCORE if is_check(game.board, game.to_move) else 0, []]
+    
+    best_move = search_random.choice(best_moves)
+    if state.tt is not None and alpha < best_score < beta:
+        state.tt.store(game.key, depth, best_score, TT_EXACT, best_move)
+    return [best_move, best_score, pvs[best_move]]
+
+# ========== PARALLEL SEARCH ==========
+#이 깊이 이상에서만 루트 수를 프로세스 풀로 나누어 탐색 (얕은 탐색은 프로세스 통신 비용이 더 큼)
+PARALLEL_MIN_DEPTH = 3
+#워커 수별로 만들어 둔 프로세스 풀 -> get_search_pool 로 가져와 재사용
+search_pools = {}
+search_pools_lock = threading.Lock()
+'''
+이미 실행 중인 워커의 탐색은 future.cancel() 로 멈출 수 없으므로, 풀마다 공유 메모리 플래그 배열을 두고
+병렬 루트 탐색마다 한 칸을 할당함 -> 루트 탐색이 끝나면(컷오프, 시간 초과) 그 칸을 설정하여 워커들이 탐색을 그만두게 함
+워커는 ABORT_CHECK_MASK+1 노드마다 플래그를 확인
+'''
+SEARCH_ABORT_SLOTS = 256
+ABORT_CHECK_MASK = 0xFF
+search_abort_slots = count()
+#워커 프로세스에서 풀의 공유 플래그 배열 (풀을 만들 때 initializer 로 설정)
+worker_abort_flags = None
+def set_worker_abort_flags(flags):
+    global worker_abort_flags
+    worker_abort_flags = flags
+#워커 프로세스 사이에 전달하기 위한 간단한 포지션 표현 (FEN, 반복 판정에 필요한 Zobrist 키 히스토리)
+def compact_position(game):
+    return (game.to_FEN(), tuple(game.key_history[-(game.halfmove_clock+1):]))
+#compact_position 으로 만든 포지션에서 게임을 복원
+def restore_position(position):
+    FEN, key_history = position
+    game = Game(FEN)
+    if key_history and key_history[-1] == game.key:
+        game.key_history = list(key_history)
+    return game
+#워커 프로세스에서 루트의 한 수를 탐색 -> [수, 점수, 노드 수, 주 변화] 를 반환
+#루트 기준 점수 alpha 의 널 윈도우로 먼저 탐색하고, alpha 를 넘으면 (alpha, beta) 창으로 다시 탐색
+#워커마다 자신의 트랜스포지션 테이블(모듈의 transposition_table)을 탐색 사이에 계속 사용하고,
+#수 정렬을 위해 부모 탐색의 킬러 무브와 히스토리를 넘겨받음
+def search_root_move(position, move, depth, alpha, beta, options, deadline, killers, history, abort_slot):
+    game = restore_position(position)
+    state = SearchState(transposition_table, options=options)
+    state.deadline = deadline
+    state.abort_flags = worker_abort_flags
+    state.abort_slot = abort_slot
+    state.killers = killers
+    state.history = history
+    game.push(move)
+    score = -negamax(game, depth-1, -alpha-1, -alpha, state, 1)
+    if alpha < score < beta:
+        score = -negamax(game, depth-1, -beta, -alpha, state, 1)
+    return [move, score, state.nodes, [move] + (state.pv[1] if depth > 1 else [])]
+'''
+워커 프로세스 수만큼의 프로세스 풀을 반환 (처음 요청할 때 생성)
+서버처럼 여러 스레드가 실행 중인 프로세스를 fork 하면 다른 스레드가 잡고 있던 잠금 때문에 자식이 멈출 수 있으므로,
+fork 대신 forkserver(없으면 spawn)로 워커를 만들고, 만들 때 바로 모든 워커를 띄워 둠
+'''
+def get_search_pool(workers):
+    with search_pools_lock:
+        if workers not in search_pools:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            flags = context.Array('b', SEARCH_ABORT_SLOTS, lock=False)
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                       initializer=set_worker_abort_flags, initargs=(flags,))
+            pool.abort_flags = flags
+            list(pool.map(abs, range(workers)))
+            search_pools[workers] = pool
+        return search_pools[workers]
+'''
+루트 수를 프로세스 풀에 나누어 탐색하는 search_root
+첫 번째(정렬상 가장 좋은) 수는 현재 프로세스에서 전체 창으로 탐색하여 기준 점수를 얻고,
+나머지 수는 워커들이 그때까지의 최고 점수의 널 윈도우로 동시에 탐색함. 최고 점수 이상인 수는 워커가 바로
+(최고 점수 - 1, beta) 창으로 다시 탐색하므로, 합칠 때는 점수가 가장 높은 수(동점이면 무작위)를 고르면 됨
+워커 사이에는 창을 공유할 수 없으므로, 이미 실행 중인 탐색은 시작할 때의 창을 그대로 사용함
+탐색이 끝나면 아직 시작하지 않은 작업은 취소하고, 실행 중인 작업은 공유 플래그로 중단시킴
+같은 깊이에서도 단일 프로세스 탐색과 점수나 수가 다를 수 있음 -> 워커의 트랜스포지션 테이블은 워커마다 따로 있고
+이전 탐색의 엔트리(더 깊이 탐색된 점수 포함)를 계속 사용하며, 킬러 무브와 히스토리는 작업을 시작할 때의 것을 받고,
+널 무브 가지치기와 LMR 의 결과는 창과 이 정보에 따라 달라지기 때문 (둘 다 그 깊이 이상의 정상적인 탐색 결과임)
+'''
+def parallel_search_root(game, depth, alpha, beta, state):
+    state.visit()
+    hash_move = None
+    if state.tt is not None:
+        entry = state.tt.probe(game.key)
+        if entry is not None:
+            hash_move = entry[4]
+    
+    moves = list(ordered_moves(game, game.to_move, state, 0, hash_move))
+    if not moves:
+        return [None, -MATE_SCORE if is_check(game.board, game.to_move) else 0, []]
+    
+    first_move = moves[0]
+    game.push(first_move)
+    best_score = -negamax(game, depth-1, -beta, -alpha, state, 1)
+    game.pop()
+    best_moves = [first_move]
+    pvs = { first_move: [first_move] + (state.pv[1] if depth > 1 else []) }
+    
+    if best_score < beta and best_score < MATE_SCORE and len(moves) > 1:
+        position = compact_position(game)
+        pending = moves[1:]
+        running = set()
+        abort_slot = next(search_abort_slots) % SEARCH_ABORT_SLOTS
+        state.pool.abort_flags[abort_slot] = 0
+        try:
+            while pending or running:
+                #워커 수만큼만 동시에 탐색하여, 새로 시작하는 수는 그때까지 찾은 가장 높은 기준 점수를 사용하도록 함
+                while pending and len(running) < state.workers:
+                    running.add(state.pool.submit(search_root_move, position, pending.pop(0), depth, best_score-1, beta,
+                                                  state.options, state.deadline, state.killers, state.history, abort_slot))
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    [move, score, nodes, pv] = future.result()
+                    state.nodes += nodes
                     if verbose:
-                        print('\t'*depth + 'cutoff')
+                        print('\t' + PIECE_CODES[get_piece(game.board, move[0])] + move2str(move) + ': ' + str(score))
+                    if score > best_score:
+                        best_score = score
+                        best_moves = [move]
+                    elif score == best_score:
+                        best_moves.append(move)
+                    else:
+                        continue
+                    pvs[move] = pv
+                if best_score >= beta or best_score >= MATE_SCORE:
                     break
-        if best_moves:
-            return [choice(best_moves), beta]
-        else:
-            return [None, beta]
+        finally:
+            #컷오프나 시간 초과(SearchTimeout)로 끝나면 아직 시작하지 않은 작업은 취소하고, 실행 중인 작업은 중단시킴
+            for future in running:
+                future.cancel()
+            state.pool.abort_flags[abort_slot] = 1
+    
+    best_move = search_random.choice(best_moves)
+    if state.tt is not None and alpha < best_score < beta:
+        state.tt.store(game.key, depth, best_score, TT_EXACT, best_move)
+    return [best_move, best_score, pvs[best_move]]
+'''
+알파-베타 탐색의 진입점 -> 점수와 창(alpha, beta)은 기존과 같이 백 기준 (백은 최대화, 흑은 최소화)
+내부적으로는 네가맥스 PVS 로 탐색하고 [최선의 수, 점수] 를 반환
+탐색이 끝나면 state.principal_variation 에 주 변화 전체, state.score 에 점수를 기록
+'''
+def alpha_beta(game, color, depth, alpha=-float('inf'), beta=float('inf'), state=None):
+    if state is None:
+        state = SearchState()
+    sign = side_sign(game)
+    if depth <= 0:
+        return [None, evaluate_game(game)]
+    if is_rule_draw(game):
+        return [None, 0]
+    
+    alpha = max(alpha, -INFINITE_SCORE)
+    beta = min(beta, INFINITE_SCORE)
+    root_search = parallel_search_root if state.pool is not None and depth >= PARALLEL_MIN_DEPTH else search_root
+    if sign == 1:
+        [move, score, pv] = root_search(game, depth, alpha, beta, state)
+    else:
+        [move, score, pv] = root_search(game, depth, -beta, -alpha, state)
+    state.principal_variation = pv
+    state.score = sign*score
+    return [move, sign*score]
 #체스 게임의 이동 코드를 파싱하여 해당 이동을 해석, 이를 실행 가능한 이동으로 변환
 def parse_move_code(game, move_code):
     move_code = move_code.replace(" ","")
@@ -1326,6 +2506,23 @@ def move2str(move):
 
 def str2bb(position_str):
     return 0b1 << str2index(position_str)
+'''
+서버와 클라이언트가 같은 방식으로 플레이어의 수를 파싱하는 함수
+'e2e4' 처럼 출발 칸과 도착 칸으로 된 입력은 그 수가 합법적일 때만 그 수로 해석함 -> parse_move_code 는 이런 입력을
+다른 수로 해석하거나(b4b3 -> b2b3) 합법적인 수를 거부하므로(g1f3) 넘기지 않음
+그 밖의 입력은 parse_move_code 의 표기('Nf3', 'e4', 'O-O' 등)로 파싱하고, 합법적인 수가 아니거나 파싱할 수 없으면 False 를 반환
+'''
+def parse_player_move(game, move_str):
+    move_str = move_str.strip()
+    if len(move_str) == 4 and move_str[0] in FILES and move_str[2] in FILES and move_str[1].isdigit() and move_str[3].isdigit():
+        if move_str[1] not in RANKS or move_str[3] not in RANKS:
+            return False
+        move = (str2bb(move_str[:2]), str2bb(move_str[2:]))
+        return move if move in list(legal_moves(game, game.to_move)) else False
+    try:
+        return parse_move_code(game, move_str)
+    except (IndexError, ValueError, KeyError):
+        return False    #parse_move_code 는 일부 잘못된 입력에서 예외를 발생시킴
 #사용자의 이동 입력을 처리하고, 유요한 이동을 반환
 def get_player_move(game):
     move = None
@@ -1334,17 +2531,88 @@ def get_player_move(game):
         if not move:
             print('Invalid move!')
     return move
+'''
+애스피레이션 윈도우 탐색 -> 이전 깊이의 점수 주변의 좁은 창으로 먼저 탐색하고,
+점수가 창 밖으로 벗어나면 창을 넓혀 다시 탐색 (마지막에는 전체 창)
+'''
+def aspiration_search(game, depth, previous_score, state):
+    if previous_score is None or abs(previous_score) >= MATE_SCORE:
+        return alpha_beta(game.copy(), game.to_move, depth, state=state)
+    
+    window = ASPIRATION_WINDOW
+    while window < MATE_SCORE:
+        alpha = previous_score - window
+        beta = previous_score + window
+        [move, score] = alpha_beta(game.copy(), game.to_move, depth, alpha, beta, state)
+        if move is not None and alpha < score < beta:
+            return [move, score]
+        if verbose:
+            print('aspiration window [{}, {}] failed with {}'.format(alpha, beta, score))
+        window *= 4
+    return alpha_beta(game.copy(), game.to_move, depth, state=state)
+'''
+반복 심화 탐색 -> 깊이 1부터 한 단계씩 깊게 탐색하고, 시간 예산(밀리초)을 넘기면 진행 중인 탐색을 버리고
+마지막으로 완료된 깊이의 최선의 수를 반환함. 깊이 1은 항상 끝까지 탐색하여 둘 수 있는 수를 보장함
+[최선의 수, 점수, 완료된 깊이] 를 반환
+'''
+def iterative_deepening(game, time_budget, max_depth=MAX_SEARCH_DEPTH, tt=None, state=None):
+    start_time = time()
+    if state is None:
+        state = SearchState(tt)
+    result = [None, 0, 0]
+    principal_variation = []
+    
+    for depth in range(1, max_depth+1):
+        try:
+            [move, score] = aspiration_search(game, depth, result[1] if depth > 1 else None, state)
+        except SearchTimeout:
+            break
+        result = [move, score, depth]
+        principal_variation = state.principal_variation
+        
+        elapsed = 1000.0*(time() - start_time)
+        if verbose:
+            print('depth {}: {} ({}) {} nodes, {:.0f} ms'.format(depth, ' '.join(move2str(m) for m in state.principal_variation), score, state.nodes, elapsed))
+        #다음 깊이는 보통 더 오래 걸리므로, 예산의 절반을 넘겼거나 메이트를 찾았으면 중단
+        if move is None or abs(score) >= PIECE_VALUES[KING] or elapsed >= time_budget/2:
+            break
+        state.set_time_budget(time_budget - elapsed)
+    #중단된 깊이에서 창을 벗어나 끝난 탐색이 남긴 주 변화와 점수 대신, 마지막으로 완료된 깊이의 것을 남김
+    state.principal_variation = principal_variation
+    state.score = result[1]
+    return result
 #AI 플레이어 최적 이동을 계산하고 반환
-def get_AI_move(game, depth=2):
+#time_budget(밀리초)을 주면 depth 대신 반복 심화 탐색으로 시간 안에 가능한 깊이까지 탐색
+#탐색 후 state.nodes 로 탐색한 노드 수를 확인할 수 있도록 SearchState 를 직접 넘겨줄 수 있음
+#options(SearchOptions)로 널 무브 가지치기, 늦은 수 감소 등의 탐색 기능을 조정
+#workers 가 2 이상이면 루트 수를 그 수만큼의 프로세스에 나누어 탐색
+def get_AI_move(game, depth=2, tt=None, time_budget=None, state=None, options=None, workers=None):
     if verbose:
         print('Searching best move for white...' if game.to_move == WHITE else 'Searching best move for black...')
     start_time = time()
+    if tt is None:
+        tt = transposition_table
+    if state is None:
+        state = SearchState(tt, options=options)
+    if workers is not None:
+        state.use_workers(workers)
 
     if find_in_book(game):
         move = get_book_move(game)
     else:
-#         move = minimax(game, game.to_move, depth)[0]
-        move = alpha_beta(game, game.to_move, depth)[0]
+        if state.tt is not None:
+            state.tt.new_search()
+        if time_budget is not None:
+            move = iterative_deepening(game, time_budget, state=state)[0]
+        else:
+#             move = minimax(game.copy(), game.to_move, depth)[0]
+            move = alpha_beta(game.copy(), game.to_move, depth, state=state)[0]
+        if verbose:
+            elapsed = max(time() - start_time, 1e-6)
+            print('Searched {} nodes ({:.0f} nodes/s)'.format(state.nodes, state.nodes/elapsed))
+            if state.tt is not None:
+                print('Transposition table: {}'.format(state.tt.stats()))
+            print('Pawn hash table: {}'.format(pawn_hash_table.stats()))
 
     end_time = time()
     if verbose:
@@ -1355,16 +2623,23 @@ def print_outcome(game):
     print(get_outcome(game))
 #현재 게임의 결과를 확인하고 반환    
 def get_outcome(game):
-    if is_stalemate(game):
+    status = game_status(game)[0]
+    if status == STALEMATE:
         return 'Draw by stalemate'
-    if is_checkmate(game, WHITE):
-        return 'BLACK wins!'
-    if is_checkmate(game, BLACK):
-        return 'WHITE wins!'
-    if has_insufficient_material(game):
+    if status == CHECKMATE:
+        return 'BLACK wins!' if game.to_move == WHITE else 'WHITE wins!'
+    if status == INSUFFICIENT_MATERIAL:
         return 'Draw by insufficient material!'
-    if is_under_75_move_rule(game):
+    if status == SEVENTY_FIVE_MOVE_RULE:
         return 'Draw by 75-move rule!'
+#게임 상태로 승자를 반환 -> 체크메이트면 둘 차례가 아닌 쪽(WHITE, BLACK), 무승부면 None, 게임이 끝나지 않았으면 False
+def get_winner(game):
+    status = game_status(game)[0]
+    if status == ONGOING:
+        return False
+    if status == CHECKMATE:
+        return opposing_color(game.to_move)
+    return None
 #백색 플레이어로 게임을 플레이
 def play_as_white(game=Game()):
     print('Playing as white!')
@@ -1420,23 +2695,217 @@ def play_as(color):
 def play_random_color():
     color = choice([WHITE, BLACK])
     play_as(color)
-#오프닝 북에서 현재 게임 상태와 일치하는 오프닝을 찾음
-def find_in_book(game):
-    if game.position_history[0] != INITIAL_FEN:
-        return False
+# ========== OPENING BOOK ==========
+#오프닝 북 파일 (한 줄에 처음 포지션부터의 수순 하나)
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book.txt')
+
+class OpeningBook:
+    '''
+    오프닝 북 파일을 한 번만 읽어 포지션(조브리스트 키)별 다음 수와 가중치를 저장한 것 -> 조회할 때 파일을 다시 읽지 않음
+    각 줄의 수순을 처음 포지션부터 두어 보면서, 지나가는 포지션마다 다음 수의 가중치(그 포지션을 지나는 줄의 수)를 더함
+    포지션으로 찾기 때문에 다른 수순으로 같은 포지션에 도달해도(트랜스포지션) 북을 사용할 수 있음
+    '''
+    def __init__(self, path=None):
+        self.positions = {}     #{조브리스트 키: {수: 가중치}}
+        if path is not None:
+            self.load(path)
+    #북 파일의 모든 줄을 읽어 추가
+    def load(self, path):
+        with open(path) as book_file:
+            for line in book_file:
+                self.add_line(line.split())
+    #수순 하나를 추가 -> 합법적이지 않은 수가 나오면 그 앞까지만 추가
+    def add_line(self, move_strs):
+        game = Game()
+        for move_str in move_strs:
+            move = (str2bb(move_str[:2]), str2bb(move_str[2:4]))
+            if move not in list(legal_moves(game, game.to_move)):
+                break
+            continuations = self.positions.setdefault(game.key, {})
+            continuations[move] = continuations.get(move, 0) + 1
+            game.push(move)
+    #현재 포지션의 {다음 수: 가중치} 를 반환 (북에 없으면 빈 딕셔너리)
+    def probe(self, game):
+        return self.probe_key(game.key)
+    #조브리스트 키로 포지션의 {다음 수: 가중치} 를 반환
+    def probe_key(self, key):
+        return self.positions.get(key, {})
+'''
+이진 오프닝 북 파일 형식
+헤더(BINARY_BOOK_MAGIC) 뒤에 (조브리스트 키 8바이트, 수 2바이트, 가중치 4바이트) 엔트리가 키, 수 순서로 정렬되어 있음
+수는 출발 칸 번호 | 도착 칸 번호 << 6 으로 저장하고, 모든 값은 빅 엔디언
+'''
+BINARY_BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book.bin')
+BINARY_BOOK_MAGIC = b'CHESSBK1'
+BINARY_BOOK_ENTRY = struct.Struct('>QHI')
+#수를 이진 북의 2바이트 정수로 변환
+def encode_book_move(move):
+    return bb2index(move[0]) | bb2index(move[1]) << 6
+#이진 북의 2바이트 정수를 수로 변환
+def decode_book_move(code):
+    return (0b1 << (code & 0x3F), 0b1 << (code >> 6))
+#오프닝 북의 모든 엔트리를 정렬하여 이진 북 파일로 저장하고 엔트리 수를 반환
+def write_binary_book(book, path):
+    entries = sorted((key, encode_book_move(move), weight)
+                     for key, continuations in book.positions.items()
+                     for move, weight in continuations.items())
+    with open(path, 'wb') as book_file:
+        book_file.write(BINARY_BOOK_MAGIC)
+        for entry in entries:
+            book_file.write(BINARY_BOOK_ENTRY.pack(*entry))
+    return len(entries)
+
+class BinaryOpeningBook:
+    '''
+    이진 오프닝 북 파일을 메모리 맵으로 열어 두고, 조회할 때마다 키를 이진 탐색하는 오프닝 북
+    파일 전체를 읽거나 파싱하지 않으므로 북이 커도 서버 시작이 빠르고, 필요한 페이지만 메모리에 올라옴
+    OpeningBook 과 같은 probe 인터페이스를 가짐
+    '''
+    #빈 파일, 헤더가 다른 파일, 엔트리 중간에서 잘린 파일이면 ValueError 를 발생
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError('{} is empty'.format(path))
+        entries_size = len(self.data) - len(BINARY_BOOK_MAGIC)
+        if self.data[:len(BINARY_BOOK_MAGIC)] != BINARY_BOOK_MAGIC or entries_size % BINARY_BOOK_ENTRY.size != 0:
+            self.close()
+            raise ValueError('{} is not a binary opening book or is truncated'.format(path))
+        self.entry_count = entries_size // BINARY_BOOK_ENTRY.size
+    #index 번째 엔트리 (키, 수 코드, 가중치) 를 읽음
+    def entry(self, index):
+        return BINARY_BOOK_ENTRY.unpack_from(self.data, len(BINARY_BOOK_MAGIC) + index*BINARY_BOOK_ENTRY.size)
+    #현재 포지션의 {다음 수: 가중치} 를 반환 (북에 없으면 빈 딕셔너리)
+    def probe(self, game):
+        return self.probe_key(game.key)
+    #조브리스트 키로 포지션의 {다음 수: 가중치} 를 반환
+    def probe_key(self, key):
+        low, high = 0, self.entry_count
+        while low < high:           #키가 key 이상인 첫 번째 엔트리를 이진 탐색
+            middle = (low + high) // 2
+            if self.entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        continuations = {}
+        while low < self.entry_count:
+            entry_key, move_code, weight = self.entry(low)
+            if entry_key != key:
+                break
+            continuations[decode_book_move(move_code)] = weight
+            low += 1
+        return continuations
     
-    openings = []
-    book_file = open("book.txt")
-    for line in book_file:
-        if line.startswith(game.get_move_list()) and line.rstrip() > game.get_move_list():
-            openings.append(line.rstrip())
-    book_file.close()
-    return openings
-#오프닝 북에서 현재 게임 상태와 일치하는 오프닝을 찾아 다음 이동을 반환
+    def close(self):
+        self.data.close()
+        self.file.close()
+#처음 사용할 때 읽어 들이는 기본 오프닝 북 -> BINARY_BOOK_FILE 이 있으면 이진 북을, 없으면 BOOK_FILE 을 사용
+opening_book = None
+#기본 오프닝 북을 반환 (아직 읽지 않았으면 읽어 들임)
+def get_opening_book():
+    global opening_book
+    if opening_book is None:
+        if os.path.exists(BINARY_BOOK_FILE):
+            try:
+                opening_book = BinaryOpeningBook(BINARY_BOOK_FILE)
+            except (OSError, ValueError) as error:
+                print('Ignoring binary opening book: {}'.format(error))     #쓸 수 없는 이진 북이면 텍스트 북을 사용
+        if opening_book is None:
+            opening_book = OpeningBook(BOOK_FILE if os.path.exists(BOOK_FILE) else None)
+    return opening_book
+#게임 결과로 북의 가중치를 조정하는 통계 파일 (서버가 게임을 마칠 때마다 갱신)
+BOOK_STATS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book_stats.json')
+#이 판 수 이상 두어졌고 점수율이 BOOK_PRUNE_SCORE 미만인 수는 북에서 제외
+BOOK_PRUNE_MIN_GAMES = 4
+BOOK_PRUNE_SCORE = 0.25
+
+class BookStatistics:
+    '''
+    북의 각 포지션에서 둔 수의 결과를 (승, 무, 패) 로 저장하는 통계 -> 그 수를 둔 쪽의 관점
+    가중치 조정: 북의 가중치(수순 빈도)에 점수율 (승 + 무/2 + 1) / (판 수 + 2) 의 두 배를 곱함 -> 결과가 없는 수는 그대로
+    충분히 두어 보았는데 점수율이 낮은 수는 가중치를 0 으로 하여 제외 -> 지는 라인을 두지 않으므로 나쁜 오프닝을 탐색으로 만회할 일이 줄어듦
+    서버의 여러 스레드에서 게임이 끝날 수 있으므로 갱신과 저장은 잠금 안에서 함
+    '''
+    def __init__(self, path=None):
+        self.path = path
+        self.moves = {}         #{(조브리스트 키, 수): [승, 무, 패]}
+        self.lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+    #통계 파일을 읽음 -> {"키(16진수)": {"수": [승, 무, 패]}}
+    def load(self, path):
+        with open(path) as stats_file:
+            positions = json.load(stats_file)
+        for key, results in positions.items():
+            for move_str, result in results.items():
+                self.moves[(int(key, 16), (str2bb(move_str[:2]), str2bb(move_str[2:4])))] = result
+    #통계를 파일에 저장 -> 임시 파일에 쓴 뒤 바꾸어 저장 도중 끊겨도 기존 파일이 깨지지 않음
+    def save(self, path=None):
+        path = path or self.path
+        positions = {}
+        for (key, move), result in self.moves.items():
+            positions.setdefault('{:016x}'.format(key), {})[move2str(move)] = result
+        with open(path + '.tmp', 'w') as stats_file:
+            json.dump(positions, stats_file, indent=1, sort_keys=True)
+        os.replace(path + '.tmp', path)
+    '''
+    끝난 게임의 수순 중 북 안에 있는 수들에 결과를 기록하고 저장
+    북을 벗어난 뒤의 수는 기록하지 않음, 결과가 없으면(게임이 끝나지 않았으면) 기록하지 않고 False 를 반환
+    '''
+    def record_game(self, game, book):
+        winner = get_winner(game)
+        if winner is False:
+            return False
+        with self.lock:
+            for move, moving_piece, _, _, _, _, key in game.undo_stack:
+                if move is None or move not in book.probe_key(key):
+                    break
+                result = self.moves.setdefault((key, move), [0, 0, 0])
+                if winner is None:
+                    result[1] += 1
+                else:
+                    result[0 if moving_piece&COLOR_MASK == winner else 2] += 1
+            if self.path is not None:
+                self.save()
+        return True
+    #북의 {수: 가중치} 에 결과를 반영한 {수: 가중치} 를 반환 -> 제외된 수는 빠짐
+    def adjust(self, key, continuations):
+        adjusted = {}
+        for move, weight in continuations.items():
+            result = self.moves.get((key, move))
+            if result is not None:
+                wins, draws, losses = result
+                games = wins + draws + losses
+                score = (wins + draws/2 + 1)/(games + 2)
+                if games >= BOOK_PRUNE_MIN_GAMES and score < BOOK_PRUNE_SCORE:
+                    continue
+                weight *= 2*score
+            adjusted[move] = weight
+        return adjusted
+#처음 사용할 때 BOOK_STATS_FILE 에서 읽어 들이는 기본 북 통계
+book_statistics = None
+#기본 북 통계를 반환 (아직 읽지 않았으면 읽어 들임)
+def get_book_statistics():
+    global book_statistics
+    if book_statistics is None:
+        book_statistics = BookStatistics(BOOK_STATS_FILE)
+    return book_statistics
+#끝난 게임의 결과를 기본 북 통계에 기록
+def record_book_game(game):
+    return get_book_statistics().record_game(game, get_opening_book())
+#오프닝 북에서 현재 포지션의 다음 수들을 찾음 -> {수: 가중치}, 없으면 빈 딕셔너리
+#이전에 만든 이진 북이나 키 충돌로 이 포지션에서 둘 수 없는 수가 나올 수 있으므로 합법적인 수만 남김
+#게임 결과 통계로 가중치를 조정하고, 지는 수로 판정된 수는 제외함
+def find_in_book(game):
+    continuations = get_opening_book().probe(game)
+    if continuations:
+        moves = list(legal_moves(game, game.to_move))
+        continuations = { move: weight for move, weight in continuations.items() if move in moves }
+    return get_book_statistics().adjust(game.key, continuations)
+#오프닝 북에서 현재 포지션의 다음 수 하나를 가중치에 비례하여 골라 반환
 def get_book_move(game):
-    openings = find_in_book(game)
-    chosen_opening = choice(openings)
-    next_moves = chosen_opening.replace(game.get_move_list(), '').lstrip()
-    move_str = next_moves.split(' ')[0]
-    move = [str2bb(move_str[:2]), str2bb(move_str[-2:])]
-    return move
+    continuations = find_in_book(game)
+    moves = list(continuations)
+    return search_random.choices(moves, [ continuations[move] for move in moves ])[0]
@@ -1,19 +1,18 @@
 import socket
 import threading
 import pygame
-from chess import Game, parse_move_code, game_ended, print_outcome, make_move, move2str, str2bb
+from chess import Game, parse_player_move, game_ended, print_outcome, make_move, move2str, str2bb
 from gui import print_board, print_rotated_board, resize_screen
+from protocol import Connection, ServerError, request_move
 # 서버의 IP 주소와 포트 설정
 HOST = '192.168.0.16'  # 서버의 로컬 IP 주소
 PORT = 65432
 
 game = Game()  # 전역 변수로 선언
-#서버로 이동 문자열을 전송하고 서버로부터 AI의 이동을 수신하는 함수
+#서버로 이동 문자열을 전송하고 서버로부터 AI의 이동을 수신하는 함수 -> 게임이 끝났으면 'GAME_OVER'
 def send_move_to_server(move_str):
-    global s
-    s.sendall(move_str.encode('utf-8'))
-    data = s.recv(1024) # 서버로부터 응답 수신
-    return data.decode('utf-8')
+    global connection
+    return request_move(connection, move_str)
 #Pygame을 사용하여 GUI를 표시하고 사용자 입력을 처리하는 함수
 def handle_gui():
     pygame.init()   #Pygame 초기화
@@ -36,10 +35,14 @@ def handle_gui():
                 square = coord2str(pos)             #놓은 위치 체스 보드 위치로 변환
                 arriving_square = square        #도착 위치 저장
                 move_str = leaving_square + arriving_square
-                move = parse_move_code(game, move_str)
+                move = parse_player_move(game, move_str)   #서버와 같은 방식으로 파싱
                 if move:
+                    try:
+                        ai_move_str = send_move_to_server(move_str) #이동을 서버로 전송하고 AI의 이동 수신
+                    except ServerError as error:
+                        print(f'Server rejected the move: {error}')   #서버가 거절한 수는 두지 않음
+                        continue
                     game = make_move(game, move)    #이동이 유효하면 게임 상태 업데이트
-                    ai_move_str = send_move_to_server(move_str) #이동을 서버로 전송하고 AI의 이동 수신
                     if ai_move_str == 'GAME_OVER':
                         print_outcome(game)
                         break
@@ -52,10 +55,11 @@ def handle_gui():
         pygame.display.flip()   #디스플레이 업데이트
 #서버에 연결하고 GUI를 실행하는 함수
 def start_client():
-    global s
+    global connection
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             s.connect((HOST, PORT)) #서버에 연결 시도
+            connection = Connection(s)  #길이가 붙은 메시지로 서버와 통신
             print('Connected to the server.')
 
             gui_thread = threading.Thread(target=handle_gui)    #GUI를 처리할 스레드 생성
@@ -0,0 +1,38 @@
+import argparse
+import sys
+from time import time
+
+from chess import OpeningBook, BinaryOpeningBook, write_binary_book, BOOK_FILE, BINARY_BOOK_FILE
+
+#book.txt 형식(한 줄에 처음 포지션부터의 수순 하나)의 파일들을 읽어 하나의 이진 오프닝 북으로 저장
+def compile_book(text_paths, binary_path):
+    start_time = time()
+    book = OpeningBook()
+    for path in text_paths:
+        book.load(path)
+    entry_count = write_binary_book(book, binary_path)
+    print('{} positions, {} entries -> {} ({:.2f}s)'.format(len(book.positions), entry_count, binary_path, time() - start_time))
+    return book
+#이진 북의 모든 포지션이 텍스트 북과 같은 수와 가중치를 돌려주는지 확인 -> 다른 포지션의 키를 출력하고, 모두 같으면 True
+def verify_book(book, binary_path):
+    binary_book = BinaryOpeningBook(binary_path)
+    mismatches = 0
+    try:
+        for key, continuations in book.positions.items():
+            if binary_book.probe_key(key) != continuations:
+                mismatches += 1
+                print('binary book mismatch for key {:016x}'.format(key))
+    finally:
+        binary_book.close()
+    print('verified {} positions, {} mismatch(es)'.format(len(book.positions), mismatches))
+    return mismatches == 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compile book.txt-style move-sequence files into a binary opening book')
+    parser.add_argument('inputs', nargs='*', default=[BOOK_FILE], help='move-sequence files (default: book.txt)')
+    parser.add_argument('-o', '--output', default=BINARY_BOOK_FILE, help='binary book path (default: book.bin next to chess.py)')
+    parser.add_argument('--verify', action='store_true', help='check every position of the binary book against the text book')
+    args = parser.parse_args()
+    book = compile_book(args.inputs, args.output)
+    if args.verify and not verify_book(book, args.output):
+        sys.exit(1)
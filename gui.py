@@ -6,10 +6,13 @@ from time import strftime #시간 포맷팅
 from copy import deepcopy #복사
 import socket
 import threading
-from chess import Game, parse_move_code, print_board, print_rotated_board, game_ended, print_outcome, make_move, move2str, str2bb
+from chess import Game, parse_player_move, print_board, print_rotated_board, game_ended, print_outcome, make_move, move2str, str2bb
+
+from protocol import Connection, ServerError, request_move
 
 HOST = '127.0.0.1'  # 서버의 IP 주소
 PORT = 65432
+server_connection = None    # 서버와의 연결 (처음 수를 보낼 때 연결)
 pygame.init()
 
 SQUARE_SIDE = 50 #체스 보드 각 칸의 한 변의 길이를 설정
@@ -243,6 +246,7 @@ def play_as(game, color):
                         if joker == 13 and chess.get_queen(game.board, color):
                             queen_index = chess.bb2index(chess.get_queen(game.board, color))
                             game.board[queen_index] = color|chess.JOKER
+                            game.key = chess.zobrist_key(game)
                             print_board(game.board, color)
                 
                 #화면 크기 조정 이벤트
@@ -265,6 +269,13 @@ def play_as(game, color):
         bug_file.write('\n-----------------------------\n\n')
         bug_file.close()
 
+#서버로 이동 문자열을 전송하고 AI의 이동을 수신 -> 'AI_MOVE' 이면 AI 가 먼저 두도록 요청, 게임이 끝났으면 'GAME_OVER'
+def send_move_to_server(move_str):
+    global server_connection
+    if server_connection is None:
+        server_connection = Connection(socket.create_connection((HOST, PORT)))
+    return request_move(server_connection, None if move_str == 'AI_MOVE' else move_str)
+
 #백색 플레이어로 체스 게임을 시작
 def play_as_white(game=chess.Game()):
     print('Playing as white!')
@@ -274,11 +285,15 @@ def play_as_white(game=chess.Game()):
             break
         
         move_str = input('Enter your move: ')
-        move = parse_move_code(game, move_str)
+        move = parse_player_move(game, move_str)
         
         if move:
+            try:
+                ai_move_str = send_move_to_server(move_str)
+            except ServerError as error:
+                print('Server rejected the move: {}'.format(error))
+                continue
             game = make_move(game, move)
-            ai_move_str = send_move_to_server(move_str)
             if ai_move_str == 'GAME_OVER':
                 print_outcome(game)
                 break
@@ -295,12 +310,19 @@ def play_as_white(game=chess.Game()):
 #흑색 플레이어로 체스 게임을 시작
 def play_as_black(game=chess.Game()):
     print('Playing as black!')
+    move_str = 'AI_MOVE'    #처음에는 AI 가 먼저 두도록 요청하고, 이후에는 플레이어의 수를 보내 AI 의 응수를 받음
     while True:
         print_rotated_board(game.board)
         if game_ended(game):
             break
         
-        ai_move_str = send_move_to_server('AI_MOVE')
+        try:
+            ai_move_str = send_move_to_server(move_str)
+        except ServerError as error:
+            print('Server error: {}'.format(error))
+            break
+        if move_str != 'AI_MOVE':
+            game = make_move(game, move)
         if ai_move_str == 'GAME_OVER':
             print_outcome(game)
             break
@@ -311,14 +333,12 @@ def play_as_black(game=chess.Game()):
         if game_ended(game):
             break
         
-        move_str = input('Enter your move: ')
-        move = parse_move_code(game, move_str)
-        
-        if move:
-            game = make_move(game, move)
-        else:
-            print('Invalid move!')
-            continue
+        move = False
+        while not move:
+            move_str = input('Enter your move: ')
+            move = parse_player_move(game, move_str)
+            if not move:
+                print('Invalid move!')
 
     print_outcome(game)
 
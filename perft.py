@@ -0,0 +1,120 @@
+import argparse
+import sys
+from time import time
+
+from chess import Game, legal_moves, pseudo_legal_moves, is_legal_move, check_mask_legal_moves, move2str, INITIAL_FEN
+
+#주어진 깊이까지 합법적인 수를 모두 두어 보고 말단 노드 수를 계산
+def perft(game, depth):
+    if depth == 0:
+        return 1
+    nodes = 0
+    for move in list(legal_moves(game, game.to_move)):
+        game.push(move)
+        nodes += perft(game, depth-1)
+        game.pop()
+    return nodes
+#루트의 수마다 말단 노드 수를 계산 -> [(수, 노드 수)] 를 반환
+def divide(game, depth):
+    counts = []
+    for move in list(legal_moves(game, game.to_move)):
+        game.push(move)
+        counts.append((move, perft(game, depth-1)))
+        game.pop()
+    return counts
+#기존 방식(모든 수를 두어 보고 체크인지 확인)으로 합법적인 수를 생성
+def make_move_legal_moves(game, color):
+    for move in pseudo_legal_moves(game, color):
+        if is_legal_move(game, move):
+            yield move
+'''
+주어진 깊이까지 모든 노드에서 체크 마스크 생성기와 기존 생성기가 같은 수를 같은 순서로 생성하는지 확인
+다른 수를 생성하는 노드가 있으면 AssertionError 를 발생시키고, 아니면 말단 노드 수를 반환
+'''
+def compare_generators(game, depth):
+    if depth == 0:
+        return 1
+    expected = list(make_move_legal_moves(game, game.to_move))
+    generated = list(check_mask_legal_moves(game, game.to_move))
+    assert generated == expected, '{}: expected {} but generated {}'.format(
+        game.to_FEN(), ' '.join(move2str(move) for move in expected), ' '.join(move2str(move) for move in generated))
+    nodes = 0
+    for move in expected:
+        game.push(move)
+        nodes += compare_generators(game, depth-1)
+        game.pop()
+    return nodes
+
+'''
+노드 수가 알려진 표준 포지션 (이름, FEN, {깊이: 노드 수})
+이 엔진은 퀸 승진만 생성하므로, 주어진 깊이 안에서 승진이 나오지 않는 포지션과 깊이만 포함함
+'''
+PERFT_SUITE = [
+    ('initial', INITIAL_FEN,
+        {1: 20, 2: 400, 3: 8902, 4: 197281}),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+        {1: 48, 2: 2039, 3: 97862}),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+        {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+        {1: 46, 2: 2079, 3: 89890}),
+    ('short_castling_check', '5k2/8/8/8/8/8/8/4K2R w K - 0 1',
+        {6: 661072}),
+    ('long_castling_check', '3k4/8/8/8/8/8/8/R3K3 w Q - 0 1',
+        {6: 803711}),
+    ('castling_rights', 'r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1',
+        {4: 1274206}),
+    ('castling_prevented', 'r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1',
+        {4: 1720476}),
+    ('double_check', '8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1',
+        {4: 23527}),
+]
+#스위트의 각 포지션을 max_depth 이하에서 노드 수가 알려진 가장 깊은 깊이로 계산하고 결과를 출력 -> 모두 맞으면 True
+def run_suite(max_depth=None):
+    passed = True
+    total_nodes = 0
+    start_time = time()
+    for name, fen, counts in PERFT_SUITE:
+        depths = [ depth for depth in counts if max_depth is None or depth <= max_depth ]
+        if not depths:
+            continue
+        depth = max(depths)
+        position_start = time()
+        nodes = perft(Game(fen), depth)
+        elapsed = max(time() - position_start, 1e-6)
+        total_nodes += nodes
+        ok = nodes == counts[depth]
+        passed = passed and ok
+        print('{} {:<22} depth {} nodes {:>9} expected {:>9} time {:>7.2f}s ({:.0f} nodes/s)'.format(
+            'PASS' if ok else 'FAIL', name, depth, nodes, counts[depth], elapsed, nodes/elapsed))
+    elapsed = max(time() - start_time, 1e-6)
+    print('{} nodes {} time {:.2f}s ({:.0f} nodes/s)'.format('PASSED' if passed else 'FAILED', total_nodes, elapsed, total_nodes/elapsed))
+    return passed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Perft / divide node counts for the move generator')
+    parser.add_argument('fen', nargs='?', default=INITIAL_FEN, help='position to search (default: initial position)')
+    parser.add_argument('depth', nargs='?', type=int, default=3, help='depth in plies')
+    parser.add_argument('-c', '--compare', action='store_true', help='check the check-mask generator against make-move legality at every node')
+    parser.add_argument('-d', '--divide', action='store_true', help='print node counts for each root move')
+    parser.add_argument('-s', '--suite', action='store_true', help='run the bundled suite of positions with known node counts')
+    parser.add_argument('-m', '--max-depth', type=int, default=None, help='deepest depth to run in --suite (default: every known count)')
+    args = parser.parse_args()
+
+    if args.suite:
+        sys.exit(0 if run_suite(args.max_depth) else 1)
+
+    start_time = time()
+    if args.compare:
+        nodes = compare_generators(Game(args.fen), args.depth)
+        print('identical move sets at every node')
+    elif args.divide:
+        counts = divide(Game(args.fen), args.depth)
+        for move, count in counts:
+            print('{}: {}'.format(move2str(move), count))
+        print('moves {}'.format(len(counts)))
+        nodes = sum(count for _, count in counts)
+    else:
+        nodes = perft(Game(args.fen), args.depth)
+    elapsed = max(time() - start_time, 1e-6)
+    print('nodes {} time {:.2f}s ({:.0f} nodes/s)'.format(nodes, elapsed, nodes/elapsed))
@@ -0,0 +1,119 @@
+import struct
+from collections import deque
+from time import time
+#클라이언트(client.py, gui.py)와 서버(server.py)가 함께 사용하는 메시지 형식
+
+'''
+메시지 하나 = 헤더(페이로드 길이 4바이트, 메시지 종류 1바이트, 빅 엔디언) + UTF-8 페이로드
+길이를 먼저 보내므로 한 번의 recv 로 메시지가 나뉘어 오거나 여러 메시지가 붙어 와도 정확히 나눌 수 있음
+
+MOVE        클라이언트 -> 서버  '<플레이어의 수> [시간 예산(밀리초)]'
+AI_MOVE     클라이언트 -> 서버  '[시간 예산(밀리초)]' -> AI 가 두도록 요청
+            서버 -> 클라이언트  '<AI 의 수>'
+GAME_OVER   서버 -> 클라이언트  게임 결과 (get_outcome)
+NEW_GAME    클라이언트 -> 서버  '[FEN]' -> 새 게임을 시작, 서버는 FEN 으로 응답
+FEN         클라이언트 -> 서버  '' -> 현재 포지션을 요청
+            서버 -> 클라이언트  현재 포지션의 FEN
+ERROR       서버 -> 클라이언트  오류 메시지 (잘못된 수, 서버가 가득 참 등)
+PING        양방향              받은 쪽은 같은 페이로드로 PING 을 돌려보냄
+'''
+MOVE, AI_MOVE, GAME_OVER, NEW_GAME, FEN, ERROR, PING = range(1, 8)
+MESSAGE_NAMES = { MOVE: 'MOVE', AI_MOVE: 'AI_MOVE', GAME_OVER: 'GAME_OVER', NEW_GAME: 'NEW_GAME', FEN: 'FEN', ERROR: 'ERROR', PING: 'PING' }
+HEADER = struct.Struct('>IB')
+MAX_PAYLOAD_SIZE = 1 << 16      #이보다 긴 메시지는 잘못된 스트림으로 간주
+RECV_SIZE = 4096
+
+class ProtocolError(Exception):
+    pass
+#메시지를 헤더를 붙인 바이트열로 변환
+def encode_message(message_type, payload=''):
+    data = payload.encode('utf-8')
+    if len(data) > MAX_PAYLOAD_SIZE:
+        raise ProtocolError('payload too long ({} bytes)'.format(len(data)))
+    return HEADER.pack(len(data), message_type) + data
+
+class MessageDecoder:
+    '''
+    받은 바이트를 차례로 넣으면 완성된 메시지들을 돌려주는 스트리밍 디코더
+    메시지의 일부만 받았으면 나머지가 올 때까지 버퍼에 남겨 둠
+    '''
+    def __init__(self):
+        self.buffer = bytearray()
+    #받은 바이트를 추가하고 완성된 메시지 [(종류, 페이로드)] 를 반환
+    def feed(self, data):
+        self.buffer += data
+        messages = []
+        while len(self.buffer) >= HEADER.size:
+            length, message_type = HEADER.unpack_from(self.buffer)
+            if length > MAX_PAYLOAD_SIZE or message_type not in MESSAGE_NAMES:
+                raise ProtocolError('invalid header (length {}, type {})'.format(length, message_type))
+            end = HEADER.size + length
+            if len(self.buffer) < end:
+                break
+            try:
+                payload = self.buffer[HEADER.size:end].decode('utf-8')
+            except UnicodeDecodeError:
+                raise ProtocolError('invalid UTF-8 payload')
+            messages.append((message_type, payload))
+            del self.buffer[:end]
+        return messages
+
+class Connection:
+    '''
+    블로킹 소켓으로 메시지를 주고받는 클래스 (클라이언트용)
+    한 번에 여러 메시지를 받으면 남은 메시지는 다음 receive 에서 돌려줌
+    '''
+    def __init__(self, sock):
+        self.sock = sock
+        self.decoder = MessageDecoder()
+        self.pending = deque()
+
+    def send(self, message_type, payload=''):
+        self.sock.sendall(encode_message(message_type, payload))
+    #다음 메시지 (종류, 페이로드) 를 받음
+    def receive(self):
+        while not self.pending:
+            data = self.sock.recv(RECV_SIZE)
+            if not data:
+                raise ConnectionError('connection closed by peer')
+            self.pending.extend(self.decoder.feed(data))
+        return self.pending.popleft()
+    #PING 을 보내고 서버가 돌려보낸 PING 의 왕복 시간(초)을 반환
+    def ping(self):
+        start_time = time()
+        self.send(PING, str(start_time))
+        while self.receive() != (PING, str(start_time)):
+            pass
+        return time() - start_time
+
+class ServerError(Exception):
+    pass
+'''
+플레이어의 수를 MOVE 로 보내거나 (move_str 이 None 이면) AI_MOVE 로 AI 가 두도록 요청하고 응답을 기다림
+AI 의 수 문자열을 반환하고, AI 가 두기 전에 게임이 끝났으면 'GAME_OVER' 를 반환
+AI 의 수로 게임이 끝나면 서버가 이어서 GAME_OVER 를 보내지만, 다음 receive 까지 버퍼에 남으므로 AI 의 수와 섞이지 않음
+서버가 ERROR 로 응답하면 ServerError 를 발생
+'''
+def request_move(connection, move_str=None, time_budget=None):
+    budget = '' if time_budget is None else ' {}'.format(time_budget)
+    if move_str is None:
+        connection.send(AI_MOVE, budget.strip())
+    else:
+        connection.send(MOVE, move_str + budget)
+    while True:
+        message_type, payload = connection.receive()
+        if message_type == AI_MOVE:
+            return payload
+        if message_type == GAME_OVER:
+            return 'GAME_OVER'
+        if message_type == ERROR:
+            raise ServerError(payload)
+#NEW_GAME 으로 새 게임을 시작하고 서버가 보낸 시작 포지션의 FEN 을 반환 -> 이전 게임에서 남은 메시지는 버림
+def new_game(connection, fen=''):
+    connection.send(NEW_GAME, fen)
+    while True:
+        message_type, payload = connection.receive()
+        if message_type == FEN:
+            return payload
+        if message_type == ERROR:
+            raise ServerError(payload)
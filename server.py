@@ -1,68 +1,268 @@
-import socket
+import argparse
+import asyncio
+import os
 import threading
-#라브러리를 가져옴 TCP Socket 통신 및 스레딩을 처리
-from chess import Game, make_move, get_AI_move, game_ended, print_outcome
+from concurrent.futures import ThreadPoolExecutor
+from traceback import format_exc
+#라브러리를 가져옴 asyncio 로 TCP 연결을 처리하고, 탐색은 스레드 풀에서 실행
+from chess import Game, make_move, get_AI_move, game_ended, print_outcome, get_outcome, parse_player_move, move2str, TranspositionTable, \
+    SearchState, iterative_deepening, legal_moves, find_in_book, get_opening_book, \
+    record_book_game, get_book_statistics, get_search_pool, count_pieces, MAX_SEARCH_DEPTH, WHITE, BLACK, KING
 #chess 모듈에서 여러 함수와 클래스를 가져옴
+from protocol import MOVE, AI_MOVE, GAME_OVER, NEW_GAME, FEN, ERROR, PING, MESSAGE_NAMES, RECV_SIZE, \
+    MessageDecoder, ProtocolError, encode_message
 HOST = '0.0.0.0'    #모든 네트워크 인터페이스에서 연결을 수락하도록 설정
 PORT = 65432        #사용할 포트 설정
-# 전역 변수로 게임 상태를 저장할 Game 객체 생성
-game = Game()       
+AI_TIME_BUDGET = 2000   #AI 가 한 수를 찾는 데 사용할 기본 시간 예산(밀리초)
+AI_WORKERS = os.cpu_count() or 1   #AI 탐색에서 루트 수를 나누어 탐색할 프로세스 수
+SEARCH_THREADS = 1      #동시에 실행할 수 있는 AI 탐색 수 -> 나머지 게임의 탐색은 차례를 기다림 (Server 설명 참고)
+MAX_GAMES = 32          #동시에 진행할 수 있는 최대 게임 수 -> 넘으면 새 연결을 거절
+PONDERING = True        #플레이어가 생각하는 동안 예상 수에 대해 미리 탐색할지 여부
 
 """
-클라이언트와의 통신을 처리하는 함수.
-클라이언트로부터 체스 이동을 수신하고 AI의 응답을 전송함.
+플레이어가 생각하는 동안 백그라운드 스레드에서 미리 탐색(폰더링)하는 클래스.
+AI 탐색의 주 변화(없으면 트랜스포지션 테이블의 해시 무브)로 플레이어의 다음 수를 예상하고,
+그 수를 둔 포지션을 시간 제한 없이 반복 심화 탐색함.
+예상이 맞으면(ponder hit) 남은 탐색 시간만 더 주고 그 결과를 AI 의 수로 사용하고,
+틀리면(ponder miss) 탐색을 바로 멈춤 -> 같은 트랜스포지션 테이블을 쓰므로 이후 탐색에 결과가 재사용됨.
+폰더링 탐색은 멈출 수 있어야 하므로 프로세스 풀을 쓰지 않고 현재 프로세스에서만 탐색함.
 """
-def handle_client(conn, addr):          #conn : 클라이언트와의 연결 소켓    addr: 클라이언트의 주소
-    global game
-    print(f'Connected by {addr}')
-    
-    while True:
-        data = conn.recv(1024)   # 클라이언트로부터 데이터를 수신
-        if not data:
-            break   # 데이터가 없으면 연결 종료
-        
-        move_str = data.decode('utf-8')
-        move = parse_move_code(game, move_str)  # 체스 이동 문자열을 이동 객체로 파싱
-        
-        if move:        # 이동이 유효하면 게임 상태 업데이트
-            game = make_move(game, move)
-            print(f'Player move: {move_str}')    # 플레이어의 이동 출력
+class Ponder:
+    def __init__(self, game, predicted_move, tt):
+        self.predicted_move = predicted_move
+        self.game = game.copy()
+        self.game.push(predicted_move)
+        self.state = SearchState(tt)
+        self.result = [None, 0, 0]      #[최선의 수, 점수, 완료된 깊이]
+        self.thread = threading.Thread(target=self.search, daemon=True)
+        self.thread.start()
+    #예상 포지션을 중단될 때까지 반복 심화 탐색
+    def search(self):
+        self.state.tt.new_search()
+        self.result = iterative_deepening(self.game, float('inf'), MAX_SEARCH_DEPTH, state=self.state)
+    #플레이어의 실제 수를 받아 폰더링을 끝냄
+    #예상이 맞았으면 time_budget(밀리초)의 절반 안에 탐색을 마무리하고 마지막으로 완료된 깊이의 결과 [최선의 수, 점수, 깊이] 를,
+    #틀렸으면 None 을 반환 -> 이때 self.state.principal_variation 도 그 깊이의 주 변화임
+    def finish(self, move, time_budget):
+        hit = move == self.predicted_move
+        self.state.stop(time_budget/2 if hit else 0)
+        self.thread.join()
+        if hit and self.result[0] is not None:
+            print(f'Ponder hit: depth {self.result[2]}, {self.state.nodes} nodes')
+            return self.result
+        return None
+
+"""
+AI 가 수를 둔 뒤의 포지션에서 플레이어의 다음 수를 예상하는 함수.
+AI 탐색의 주 변화에서 두 번째 수를 사용하고, 없으면 트랜스포지션 테이블의 해시 무브를 사용함.
+예상한 수가 없거나 합법적인 수가 아니면 None 을 반환.
+"""
+def predict_player_move(game, ai_move, principal_variation, tt):
+    if len(principal_variation) > 1 and principal_variation[0] == ai_move:
+        move = principal_variation[1]
+    else:
+        entry = tt.probe(game.key)
+        move = entry[4] if entry is not None else None
+    if move is None or move not in list(legal_moves(game, game.to_move)):
+        return None
+    return move
+
+#시간 예산(밀리초) 인자를 파싱 -> 없거나 숫자가 아니면 기본값 사용
+def parse_time_budget(args):
+    return int(args[0]) if args and args[0].isdigit() else AI_TIME_BUDGET
+
+"""
+서버 전체에서 공유하는 자원.
+AI 탐색은 CPU 를 오래 사용하므로 이벤트 루프를 막지 않도록 search_threads 개의 스레드 풀에서 실행하고,
+폰더링도 같은 수만큼만 동시에 실행되도록 ponder_slots 로 제한함 (자리가 없으면 그 게임은 폰더링하지 않음).
+탐색은 순수 파이썬이라 GIL 때문에 이 프로세스의 스레드들은 코어 하나를 나누어 씀 -> 탐색 스레드가 N 개면 각 탐색은
+시간 예산 안에 약 1/N 의 노드만 탐색하므로(폰더링 스레드도 마찬가지) 기본값은 1 이고, 여러 코어는 workers 개의
+프로세스로 한 탐색의 루트 수를 나누어 사용함. 차례를 기다린 탐색도 시작할 때부터 시간 예산을 모두 사용함.
+"""
+class Server:
+    def __init__(self, max_games=MAX_GAMES, search_threads=SEARCH_THREADS, workers=AI_WORKERS):
+        self.max_games = max_games
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=search_threads, thread_name_prefix='search')
+        self.ponder_slots = threading.BoundedSemaphore(search_threads)
+        self.sessions = set()
+    #새 연결을 처리 -> 최대 게임 수를 넘으면 거절
+    async def handle_connection(self, reader, writer):
+        addr = writer.get_extra_info('peername')
+        if len(self.sessions) >= self.max_games:
+            print(f'Rejected {addr}: {len(self.sessions)} games in progress')
+            writer.write(encode_message(ERROR, 'server busy'))
+            await writer.drain()
+            writer.close()
+            return
+        session = GameSession(self, reader, writer)
+        self.sessions.add(session)
+        print(f'Connected by {addr} ({len(self.sessions)} games)')
+        try:
+            await session.run()
+        except ConnectionError as error:
+            print(f'Connection with {addr} lost: {error}')
+        except Exception:
+            # 한 게임에서 생긴 오류로 서버가 멈추지 않도록 기록만 하고 그 연결을 닫음
+            print(f'Session with {addr} failed:\n{format_exc()}')
+        finally:
+            self.sessions.discard(session)
+            await session.close()
+            print(f'Disconnected {addr} ({len(self.sessions)} games)')
+
+"""
+클라이언트 연결 하나의 게임 상태를 가지는 클래스.
+연결마다 자신의 Game 과 트랜스포지션 테이블, 폰더링을 가지므로 동시에 여러 게임을 진행해도 서로 영향을 주지 않음.
+"""
+class GameSession:
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.game = Game()
+        self.tt = TranspositionTable()  # 게임이 진행되는 동안 유지 -> 플레이어의 수 사이에도 탐색 결과를 재사용
+        self.ponder = None              # 진행 중인 폰더링 (없으면 None)
+    #클라이언트로부터 메시지를 받아 차례로 처리 -> 한 번에 여러 메시지가 오거나 메시지가 나뉘어 와도 MessageDecoder 가 나눠 줌
+    async def run(self):
+        decoder = MessageDecoder()
+        while True:
+            data = await self.reader.read(RECV_SIZE)   # 클라이언트로부터 데이터를 수신
+            if not data:
+                break   # 데이터가 없으면 연결 종료
+            try:
+                messages = decoder.feed(data)
+            except ProtocolError as error:
+                await self.send(ERROR, str(error))  # 메시지 경계를 잃었으므로 연결을 끊음
+                break
+            for message_type, payload in messages:
+                await self.handle_message(message_type, payload)
+    #메시지 하나를 처리
+    async def handle_message(self, message_type, payload):
+        if message_type == PING:
+            await self.send(PING, payload)
+        elif message_type == FEN:
+            await self.send(FEN, self.game.to_FEN())
+        elif message_type == NEW_GAME:
+            await self.finish_ponder(None, 0)
+            try:
+                game = Game(payload.strip())
+            except (KeyError, IndexError, ValueError):
+                await self.send(ERROR, f'invalid FEN: {payload}')
+                return
+            # 양쪽 모두 킹이 정확히 하나씩 있는 포지션만 받음
+            if any(count_pieces(game.board.piece_bitboards[color|KING]) != 1 for color in (WHITE, BLACK)):
+                await self.send(ERROR, f'invalid FEN (each side needs exactly one king): {payload}')
+                return
+            self.game = game
+            await self.send(FEN, self.game.to_FEN())
+        elif message_type == MOVE:
+            # 페이로드 형식: '<이동> [시간 예산(밀리초)]' -> 예산이 없으면 기본값 사용
+            request = payload.split()
+            move_str = request[0] if request else ''
+            move = parse_player_move(self.game, move_str) if not game_ended(self.game) else None
+            if not move:
+                await self.send(ERROR, 'game is over' if game_ended(self.game) else f'invalid move: {move_str}')
+                return
+            await self.play(move, parse_time_budget(request[1:]))
+        elif message_type == AI_MOVE:
+            if game_ended(self.game):
+                await self.send(ERROR, 'game is over')
+                return
+            await self.play(None, parse_time_budget(payload.split()))
+        else:
+            await self.send(ERROR, f'unexpected message: {MESSAGE_NAMES[message_type]}')
+    #플레이어의 수를 두고(None 이면 두지 않음) AI 의 수를 찾아 전송
+    async def play(self, move, time_budget):
+        # 폰더링 중이었으면 멈추고, 플레이어의 수를 예상한 대로 두었으면 그 탐색 결과를 AI 의 수로 사용
+        ponder_result = await self.finish_ponder(move, time_budget)
+        if move is not None:
+            self.game = make_move(self.game, move)  # 게임 상태 업데이트
+            print(f'Player move: {move2str(move)}')    # 플레이어의 이동 출력
         # 게임 종료 여부 확인
-        if game_ended(game):
-            print_outcome(game)
-            conn.sendall(b'GAME_OVER')
-            break
-        # AI의 이동 계산
-        ai_move = get_AI_move(game)
-        game = make_move(game, ai_move) # 게임 상태 업데이트
+        if await self.game_over():
+            return
+        # AI의 이동 계산 -> 탐색은 스레드 풀에서 실행
+        if ponder_result is not None and not find_in_book(self.game):
+            state, [ai_move, _, _] = ponder_result
+        else:
+            state = SearchState(self.tt)
+            state.use_workers(self.server.workers)
+            loop = asyncio.get_running_loop()
+            ai_move = await loop.run_in_executor(self.server.executor, self.search, self.game.copy(), time_budget, state)
+        self.game = make_move(self.game, ai_move) # 게임 상태 업데이트
         ai_move_str = move2str(ai_move) # AI 이동을 문자열로 변환
         print(f'AI move: {ai_move_str}')    # AI의 이동 출력
-         # AI의 이동을 클라이언트에 전송
-        conn.sendall(ai_move_str.encode('utf-8'))
+        await self.send(AI_MOVE, ai_move_str)   # AI의 이동을 클라이언트에 전송
         
-        if game_ended(game):
-            print_outcome(game)
-            conn.sendall(b'GAME_OVER')
-            break
-
-    conn.close()    # 클라이언트와의 연결 종료
+        if await self.game_over():
+            return
+        # 플레이어가 생각하는 동안 예상 수에 대해 미리 탐색
+        if PONDERING:
+            self.start_ponder(ai_move, state.principal_variation)
+    #클라이언트에 메시지를 전송
+    async def send(self, message_type, payload=''):
+        self.writer.write(encode_message(message_type, payload))
+        await self.writer.drain()
+    #스레드 풀에서 실행되는 AI 탐색
+    @staticmethod
+    def search(game, time_budget, state):
+        return get_AI_move(game, time_budget=time_budget, state=state)
+    #게임이 끝났으면 결과를 기록하고 GAME_OVER 를 전송한 뒤 True 를 반환
+    async def game_over(self):
+        if not game_ended(self.game):
+            return False
+        print_outcome(self.game)
+        await asyncio.to_thread(record_book_game, self.game)  # 게임 결과를 오프닝 북 통계에 반영
+        await self.send(GAME_OVER, get_outcome(self.game))
+        return True
+    #폰더링 자리가 있으면 플레이어의 예상 수에 대해 폰더링을 시작
+    def start_ponder(self, ai_move, principal_variation):
+        predicted_move = predict_player_move(self.game, ai_move, principal_variation, self.tt)
+        if predicted_move is not None and self.server.ponder_slots.acquire(blocking=False):
+            self.ponder = Ponder(self.game, predicted_move, self.tt)
+    #진행 중인 폰더링을 끝내고, 예상이 맞았으면 [폰더링의 SearchState, 완료된 결과] 를, 아니면 None 을 반환
+    #폰더링 스레드를 기다리는 동안 이벤트 루프를 막지 않음
+    async def finish_ponder(self, move, time_budget):
+        if self.ponder is None:
+            return None
+        ponder, self.ponder = self.ponder, None
+        try:
+            result = await asyncio.to_thread(ponder.finish, move, time_budget)
+        finally:
+            self.server.ponder_slots.release()
+        return [ponder.state, result] if result is not None else None
+    #폰더링을 멈추고 클라이언트와의 연결을 종료
+    async def close(self):
+        await self.finish_ponder(None, 0)
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
     
 """
 서버 소켓을 설정하고 클라이언트 연결을 대기하는 함수.
-클라이언트 연결이 수락되면 handle_client 함수에서 처리.
+클라이언트 연결이 수락되면 GameSession 에서 처리.
 """
-def start_server():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind((HOST, PORT))
-        s.listen()
-        print('Server started, waiting for connection...')
-        
-        while True:
-            # 클라이언트의 연결 요청을 수락
-            conn, addr = s.accept()
-            # 새 스레드를 생성하여 클라이언트와의 통신을 처리
-            client_handler = threading.Thread(target=handle_client, args=(conn, addr))
-            client_handler.start()
+async def serve(host=HOST, port=PORT, max_games=MAX_GAMES, search_threads=SEARCH_THREADS, workers=AI_WORKERS):
+    get_opening_book()      # 오프닝 북을 서버 시작 시 한 번만 읽어 둠
+    get_book_statistics()   # 게임 결과로 쌓인 북 통계도 함께 읽어 둠
+    if workers > 1:
+        get_search_pool(workers)    # 여러 스레드에서 동시에 만들지 않도록 프로세스 풀을 미리 만들어 둠
+    server = Server(max_games, search_threads, workers)
+    async with await asyncio.start_server(server.handle_connection, host, port) as listener:
+        print(f'Server started (up to {max_games} games, {search_threads} concurrent searches), waiting for connection...')
+        await listener.serve_forever()
+
+def start_server(host=HOST, port=PORT, max_games=MAX_GAMES, search_threads=SEARCH_THREADS, workers=AI_WORKERS):
+    asyncio.run(serve(host, port, max_games, search_threads, workers))
 
 if __name__ == "__main__":
-    start_server()
+    parser = argparse.ArgumentParser(description='Chess AI server')
+    parser.add_argument('--host', default=HOST, help='address to listen on')
+    parser.add_argument('--port', type=int, default=PORT, help='port to listen on')
+    parser.add_argument('-g', '--max-games', type=int, default=MAX_GAMES, help='maximum number of concurrent games')
+    parser.add_argument('-s', '--search-threads', type=int, default=SEARCH_THREADS, help='maximum number of concurrent AI searches (threads share one core)')
+    parser.add_argument('-w', '--workers', type=int, default=AI_WORKERS, help='worker processes for each AI search')
+    args = parser.parse_args()
+    start_server(args.host, args.port, args.max_games, args.search_threads, args.workers)